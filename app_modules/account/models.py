@@ -1,14 +1,16 @@
 import random
 
 from django.contrib.auth.models import AbstractUser
-from django.db import IntegrityError
+from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
 from django.utils import timezone
 
 from lib.constants import USER_TYPE, UserConstants, PROFESSION_TYPE
-from lib.helpers import rename_file_name, converter_to_webp
+from lib.helpers import rename_file_name
 from lib.models import BaseModel
+from lib.search import trigram_index
 from .managers import UserManager
+from .sequences import ORDER_NUMBERS
 
 
 class User(AbstractUser, BaseModel):
@@ -24,12 +26,19 @@ class User(AbstractUser, BaseModel):
     is_verify = models.BooleanField(default=False)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    # Embedded in issued tokens; bumping it revokes every token of the user
+    token_generation = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
     objects = UserManager()
-    
+
+    class Meta:
+        indexes = [
+            trigram_index('first_name', 'last_name', 'email', 'whatsapp_number', name='account_user_search_trgm'),
+        ]
+
     def soft_delete(self):
         self.is_deleted = True
         self.deleted_at = timezone.now()
@@ -52,18 +61,11 @@ class User(AbstractUser, BaseModel):
         super(User, self).save(*args, **kwargs)
 
     def get_or_create_user_code(self, code_type=UserConstants.FORGOTTEN_PASSWORD):
-        try:
-            user_code, created = UserCode.objects.get_or_create(
-                user=self, code_type=code_type,
-                defaults={"code": random.randint(1000, 9999)}
-            )
-            if not created:
-                user_code.code = random.randint(1000, 9999)
-                user_code.save()
-
-            return user_code, created
-        except IntegrityError:  # Handle the case when unique constraint is violated
-            return self.get_or_create_user_code(code_type)
+        # update_or_create locks the row, and recovers from a concurrent insert itself
+        return UserCode.objects.update_or_create(
+            user=self, code_type=code_type,
+            defaults={"code": random.randint(1000, 9999), "timestamp": timezone.now()}
+        )
 
 
 class UserCode(models.Model):
@@ -83,9 +85,23 @@ class UserCode(models.Model):
         return f"Code for {self.user} is {self.code}"
 
 
+class TokenEpoch(models.Model):
+    """
+    Single row holding the global token epoch: tokens issued before
+    ``issued_before`` are rejected, which logs every user out at once.
+    """
+    issued_before = models.DateTimeField()
+
+    def __str__(self):
+        return f"Tokens issued before {self.issued_before}"
+
+
 class CustomerGroup(BaseModel):
     name = models.CharField(max_length=50)
 
+    class Meta:
+        indexes = [trigram_index('name', name='account_group_name_trgm')]
+
     def __str__(self) -> str:
         return f"{self.name}"
 
@@ -110,15 +126,19 @@ class CustomerFrame(BaseModel):
         null=True, blank=True
     )
     display_name = models.CharField(max_length=20, null=True, blank=True)
+    # Frame image dimensions, probed once at upload time for video renders
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    renditions = GenericRelation('master.ImageRendition')
+
+    rendition_fields = ('frame_img',)
+
+    class Meta:
+        indexes = [trigram_index('display_name', name='account_frame_name_trgm')]
 
     def __str__(self) -> str:
         return f"{self.customer.whatsapp_number} and {self.group}"
 
-    def save(self, *args, **kwargs):
-        if self.frame_img:
-            converter_to_webp(self.frame_img)
-        super().save(*args, **kwargs)
-
     def is_a_group(self):
         # Check if the group name starts with 'A'
         return self.group.name.startswith('A') if self.group else False
@@ -140,24 +160,13 @@ class Plan(BaseModel):
         return self.name
 
 
-def order_number():
-    last_subscription = Subscription.objects.all().order_by('id').last()
-    if not last_subscription:
-        return 'ADS1001'
-
-    order_no = last_subscription.order_number
-    try:
-        order_int = int(order_no[3:])
-    except ValueError:
-        return 'ADS1001'
-
-    new_order_int = order_int + 1
-    new_order_no = f'ADS{new_order_int:04}'
-    return new_order_no
+class OrderNumberField(models.CharField):
+    # Read back with INSERT ... RETURNING, as the number is drawn by the database
+    db_returning = True
 
 
 class Subscription(BaseModel):
-    order_number = models.CharField(max_length=10, default=order_number, unique=True)
+    order_number = OrderNumberField(max_length=10, unique=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="subscription_users")
     frame = models.ForeignKey(CustomerFrame, on_delete=models.SET_NULL,
                               related_name="subscription_frames", null=True)
@@ -169,13 +178,20 @@ class Subscription(BaseModel):
     transaction_number = models.CharField(max_length=50, null=True, blank=True)
     file = models.FileField(upload_to=rename_file_name('subscription/'), null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    renditions = GenericRelation('master.ImageRendition')
+
+    rendition_fields = ('file',)
+
+    class Meta:
+        indexes = [
+            trigram_index('order_number', 'transaction_number', name='account_subscription_trgm'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.order_number} {self.plan.name}"
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            self.order_number = order_number()
-        if self.file:
-            converter_to_webp(self.file)
+            # Drawn from the order number sequence by the INSERT itself
+            self.order_number = ORDER_NUMBERS.next_value()
         super().save(*args, **kwargs)
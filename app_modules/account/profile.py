@@ -0,0 +1,151 @@
+"""
+Per-user snapshots of the login profile and the mobile dashboard.
+
+Everything LoginView and MobileDashboardApi return besides the tokens and the
+user's own columns (frames, business categories, subscription dates,
+is_a_group) is built once and kept in the cache. Saves of the underlying rows
+invalidate it (see account.signal). Date dependent values are derived from
+the stored dates on every read, so a snapshot never goes stale overnight.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.cache import cache
+from django.db.models import F, Max, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import JSONObject
+
+from app_modules.master.models import ImageRendition
+from app_modules.post.models import BusinessCategory
+from .models import CustomerFrame, Subscription, User
+
+LOGIN_PROFILE_TIMEOUT = 60 * 60 * 24
+MOBILE_DASHBOARD_TIMEOUT = 60 * 60 * 24
+# Snapshots waiting for thumbnail renditions are rebuilt soon
+MOBILE_DASHBOARD_PENDING_TIMEOUT = 60
+
+
+def login_profile_key(user_id):
+    return f"login_profile_{user_id}"
+
+
+def build_login_profile(user):
+    frames = list(
+        CustomerFrame.objects.filter(customer=user)
+        .select_related('business_category', 'group')
+        .order_by('business_category__id', 'id')
+    )
+    subscription = user.subscription_users.order_by('id').first()
+
+    profession_types = {}
+    for frame in frames:
+        category = frame.business_category
+        if category:
+            profession_type = profession_types.setdefault(
+                frame.profession_type, {"name": frame.profession_type, "categories": []}
+            )
+            profession_type["categories"].append({
+                "id": category.id,
+                "business_sub_category_name": category.name,
+                # Made absolute per request
+                "file": category.thumbnail.url if category.thumbnail else None,
+            })
+
+    return {
+        'is_a_group': bool(frames and frames[0].is_a_group()),
+        'subscription_end_date': subscription.end_date if subscription else None,
+        'profession_types': list(profession_types.values()),
+    }
+
+
+def get_login_profile(user):
+    key = login_profile_key(user.id)
+    profile = cache.get(key)
+    if profile is None:
+        profile = build_login_profile(user)
+        cache.set(key, profile, LOGIN_PROFILE_TIMEOUT)
+    return profile
+
+
+def mobile_dashboard_key(user_id):
+    return f"mobile_dashboard_{user_id}"
+
+
+def _subscription_dates(aggregate):
+    return Subquery(
+        Subscription.objects.filter(user=OuterRef('pk')).order_by().values('user')
+        .annotate(value=aggregate('end_date')).values('value')
+    )
+
+
+def build_mobile_dashboard(user):
+    """
+    Subscription window and assigned business categories, with their
+    thumbnail renditions, in one aggregated query.
+    """
+    renditions = ImageRendition.objects.filter(
+        content_type=ContentType.objects.get_for_model(BusinessCategory),
+        object_id=OuterRef('customer_frame__business_category__id'),
+        field_name='thumbnail',
+        source_name=OuterRef('customer_frame__business_category__thumbnail'),
+    ).order_by('width').values(json=JSONObject(format='format', width='width', file='file'))
+
+    row = User.objects.filter(pk=user.pk).annotate(
+        first_end_date=_subscription_dates(Min),
+        last_end_date=_subscription_dates(Max),
+        categories=ArrayAgg(
+            JSONObject(
+                id='customer_frame__business_category__id',
+                profession_type='customer_frame__business_category__profession_type',
+                name='customer_frame__business_category__name',
+                thumbnail='customer_frame__business_category__thumbnail',
+                renditions=ArraySubquery(renditions),
+            ),
+            filter=Q(customer_frame__business_category__isnull=False),
+            ordering=F('customer_frame__id').asc(),
+            default=Value([]),
+        ),
+    ).values('first_end_date', 'last_end_date', 'categories').get()
+
+    storage = BusinessCategory._meta.get_field('thumbnail').storage
+    rendition_storage = ImageRendition._meta.get_field('file').storage
+    categories = []
+    for category in row['categories']:
+        srcset = {}
+        for rendition in category['renditions']:
+            srcset.setdefault(rendition['format'], []).append(
+                f"{rendition_storage.url(rendition['file'])} {rendition['width']}w"
+            )
+        categories.append({
+            'id': category['id'],
+            'profession_type': category['profession_type'],
+            'name': category['name'],
+            'thumbnail': storage.url(category['thumbnail']) if category['thumbnail'] else None,
+            'thumbnail_srcset': {
+                fmt: ", ".join(candidates) for fmt, candidates in srcset.items()
+            } if category['thumbnail'] else {},
+        })
+
+    return {
+        'first_end_date': row['first_end_date'],
+        'last_end_date': row['last_end_date'],
+        'assigned_business_categories': categories,
+    }
+
+
+def get_mobile_dashboard(user):
+    key = mobile_dashboard_key(user.id)
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = build_mobile_dashboard(user)
+        pending = any(
+            category['thumbnail'] and not category['thumbnail_srcset']
+            for category in dashboard['assigned_business_categories']
+        )
+        cache.set(key, dashboard, MOBILE_DASHBOARD_PENDING_TIMEOUT if pending else MOBILE_DASHBOARD_TIMEOUT)
+    return dashboard
+
+
+def invalidate_user_snapshots(user_ids):
+    cache.delete_many([
+        key for user_id in user_ids for key in (login_profile_key(user_id), mobile_dashboard_key(user_id))
+    ])
@@ -0,0 +1,58 @@
+"""
+Postgres sequences behind human readable numbers.
+
+Subscription order numbers (``ADS1001``, ``ADS1002``, ...) are drawn from a
+sequence, so concurrent checkouts never compute the same number. A single
+subscription takes its number inside its own INSERT; imports reserve whole
+blocks up front with ``allocate``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import CharField, Func, Value
+from django.db.models.functions import Cast, Concat
+
+
+class Sequence:
+    def __init__(self, name, prefix, start):
+        self.name = name
+        self.prefix = prefix
+        self.start = start
+
+    def format(self, value):
+        return f"{self.prefix}{value:04}"
+
+    def ensure(self, table, column):
+        """
+        Create the sequence if it does not exist yet, starting after the
+        highest number already stored in ``table.column``.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [self.name])
+            if cursor.fetchone()[0] is not None:
+                return
+            cursor.execute(
+                f"SELECT MAX(substring({column} FROM %s)::bigint) FROM {table} WHERE {column} ~ %s",
+                [len(self.prefix) + 1, f"^{re.escape(self.prefix)}[0-9]+$"]
+            )
+            highest = cursor.fetchone()[0]
+            start = max(self.start, (highest or 0) + 1)
+            cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {self.name} START WITH {int(start)}")
+
+    def next_value(self):
+        """
+        Expression drawing the next formatted number when the row is saved.
+        """
+        nextval = Func(Value(self.name), function='nextval')
+        return Concat(Value(self.prefix), Cast(nextval, output_field=CharField()), output_field=CharField())
+
+    def allocate(self, count=1):
+        """
+        Reserve ``count`` numbers in one statement, e.g. for bulk_create.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [self.name, count])
+            return [self.format(row[0]) for row in cursor.fetchall()]
+
+
+ORDER_NUMBERS = Sequence('account_subscription_order_number_seq', prefix='ADS', start=1001)
@@ -3,11 +3,11 @@ from datetime import date
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 
-from app_modules.post.models import Post, CustomerPostFrameMapping, CustomerOtherPostFrameMapping, OtherPost
 from .models import (
     User, CustomerFrame, CustomerGroup, PaymentMethod, Plan, Subscription
 )
 from django.db.models import F
+from lib.serializers import SrcsetField
 
 
 class CustomerRegistrationSerializer(serializers.ModelSerializer):
@@ -63,12 +63,13 @@ class CustomerFrameSerializer(serializers.ModelSerializer):
     group_name = serializers.SerializerMethodField()
     mobile_number = serializers.SerializerMethodField()
     business_category_name = serializers.SerializerMethodField()
+    frame_img_srcset = SrcsetField('frame_img')
 
     class Meta:
         model = CustomerFrame
         fields = (
-            'id', 'customer', 'frame_img', 'group', 'group_name', 'display_name', 'mobile_number', 'business_category',
-            'profession_type', 'business_category_name', 'updated_on'
+            'id', 'customer', 'frame_img', 'frame_img_srcset', 'group', 'group_name', 'display_name', 'mobile_number',
+            'business_category', 'profession_type', 'business_category_name', 'updated_on'
         )
 
     def create(self, validated_data):
@@ -108,51 +109,6 @@ class CustomerFrameSerializer(serializers.ModelSerializer):
 
         return super().create(validated_data)
 
-    def update(self, instance, validated_data):
-        current_date = date.today()
-        old_group_id = instance.group.id if instance.group else None
-
-        # Update the instance with validated data
-        instance = super().update(instance, validated_data)
-
-        if old_group_id and 'group' in validated_data:
-            new_group_id = validated_data['group'].id if validated_data['group'] else None
-            
-            new_post_ids = Post.objects.filter(
-                group_id=new_group_id,
-                event__event_date__gte=current_date
-            ).values_list('id', flat=True)
-            
-            new_other_post_ids = OtherPost.objects.filter(group_id=new_group_id).values_list('id', flat=True)
-            
-            old_post_ids = Post.objects.filter(
-                group_id=old_group_id,
-                event__event_date__gte=current_date
-            ).values_list('id', flat=True)
-            
-            old_other_post_ids = OtherPost.objects.filter(group_id=old_group_id).values_list('id', flat=True)
-            
-            old_post_mapping = CustomerPostFrameMapping.objects.filter(
-                customer_frame_id=instance.id,
-                post_id__in=old_post_ids
-            )
-            
-            old_other_post_mapping = CustomerOtherPostFrameMapping.objects.filter(
-                customer_frame_id=instance.id,
-                other_post_id__in=old_other_post_ids
-            )
-            
-            for mapping, new_post_id in zip(old_post_mapping, new_post_ids):
-                mapping.post_id = new_post_id
-                mapping.save()
-                
-            for mapping, new_other_post_id in zip(old_other_post_mapping, new_other_post_ids):
-                mapping.other_post_id = new_other_post_id
-                mapping.save()
-                    
-            
-        return instance
-
     def get_group_name(self, obj):
         return getattr(obj.group, 'name', None)
 
@@ -171,7 +127,11 @@ class CustomerGroupSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'frame_count')
 
     def get_frame_count(self, obj):
-        return obj.customer_frame_group.count()
+        # Views annotate `frame_count`; a freshly created or updated group falls back to a query
+        frame_count = getattr(obj, 'frame_count', None)
+        if frame_count is None:
+            frame_count = obj.customer_frame_group.count()
+        return frame_count
 
 
 class CuatomerListSerializer(serializers.ModelSerializer):
@@ -207,6 +167,8 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             'start_date', 'end_date', 'transaction_number', 'file', 'is_active', 'is_expired', 'days_left',
             'display_name', 'payment_method_name'
         ]
+        # Issued by the order number sequence
+        read_only_fields = ['order_number']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
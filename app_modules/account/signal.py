@@ -1,29 +1,93 @@
-import datetime
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, post_migrate, pre_migrate
 from django.dispatch import receiver
-from .tasks import *
 
-from app_modules.post.models import *
-from .models import CustomerFrame
+from app_modules.master.tasks import store_media_metadata
+from app_modules.post.models import BusinessCategory
+from lib.authentication import invalidate_cached_user
+from lib.dispatch import on_commit_batch, register_reconciler, suspendable
+from lib.search import ensure_trigram_extension
+from .models import User, CustomerFrame, CustomerGroup, Subscription
+from .profile import invalidate_user_snapshots
+from .sequences import ORDER_NUMBERS
+from .tasks import FRAME_SYNCS, schedule_frame_sync
+
+# Changing any of these changes which posts the frame is mapped to.
+FRAME_MAPPING_FIELDS = {'group', 'business_category', 'profession_type'}
+
+# Group and business category fields copied into the per-user snapshots
+SNAPSHOT_FIELDS = {'name', 'thumbnail', 'profession_type'}
 
 
 @receiver(post_save, sender=CustomerFrame)
-def trigger_mapping_post_task(sender, instance, created, **kwargs):
-    if created:
-        # mapping_customer_frame_with_post.delay(instance.id)
-        mapping_customer_frame_with_post(instance.id)
+@suspendable
+def trigger_frame_mapping_sync(sender, instance, created, update_fields=None, **kwargs):
+    changed = set(update_fields) if update_fields is not None else FRAME_MAPPING_FIELDS
+    if created or changed & FRAME_MAPPING_FIELDS or 'frame_img' in changed:
+        schedule_frame_sync(instance.id, reset_downloads=not created and 'frame_img' in changed)
+
+
+def sync_imported_frames(touched):
+    # Imports don't say what changed, so downloads are kept
+    FRAME_SYNCS.trigger(*touched[CustomerFrame])
+
+
+register_reconciler(sync_imported_frames, CustomerFrame)
 
 
 @receiver(post_save, sender=CustomerFrame)
-def trigger_mapping_task(sender, instance, created, **kwargs):
-    if created:
-        # mapping_customer_frame_with_other_posts.delay(instance.id)
-        mapping_customer_frame_with_other_posts(instance.id)
+def store_frame_image_metadata(sender, instance, created, update_fields=None, **kwargs):
+    if instance.frame_img and (created or update_fields is None or 'frame_img' in update_fields):
+        # ffprobe runs on a worker, not in the request saving the frame
+        transaction.on_commit(lambda: store_media_metadata.delay(
+            sender._meta.app_label, sender._meta.model_name, instance.pk, 'frame_img', ('width', 'height')
+        ))
 
 
 @receiver(post_save, sender=CustomerFrame)
-def trigger_customer_frame_mapping(sender, instance, created, **kwargs):
-    if created:
-        # map_customer_frame_with_business_posts.delay(instance.id)
-        map_customer_frame_with_business_posts(instance.id)
+@receiver(post_delete, sender=CustomerFrame)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_owner_snapshots(sender, instance, **kwargs):
+    user_id = instance.customer_id if sender is CustomerFrame else instance.user_id
+    invalidate_snapshots_on_commit([user_id])
+
+
+def invalidate_snapshots_on_commit(user_ids):
+    # One delete_many per transaction, however many rows it saved
+    on_commit_batch(
+        'user_snapshots', user_ids,
+        lambda batches: invalidate_user_snapshots(sorted({user_id for batch in batches for user_id in batch})),
+    )
+
+
+@receiver(post_save, sender=CustomerGroup)
+@receiver(post_save, sender=BusinessCategory)
+def invalidate_member_snapshots(sender, instance, created, update_fields=None, **kwargs):
+    # Group names decide is_a_group; categories are listed in the login profile and dashboard
+    if created or (update_fields is not None and not SNAPSHOT_FIELDS.intersection(update_fields)):
+        return
+    frames = CustomerFrame.objects.filter(
+        **{'group' if sender is CustomerGroup else 'business_category': instance}
+    )
+    invalidate_snapshots_on_commit(list(frames.values_list('customer_id', flat=True).distinct()))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    # Covers profile edits, soft_delete, restore and password changes, which all save the user
+    transaction.on_commit(lambda: invalidate_cached_user(instance.id))
+
+
+@receiver(pre_migrate)
+def create_trigram_extension(sender, **kwargs):
+    # Before any migration runs, so the search indexes can use gin_trgm_ops
+    if sender.label == User._meta.app_label:
+        ensure_trigram_extension()
+
+
+@receiver(post_migrate)
+def create_order_number_sequence(sender, **kwargs):
+    if sender.label == Subscription._meta.app_label:
+        ORDER_NUMBERS.ensure(Subscription._meta.db_table, 'order_number')
@@ -1,3 +1,144 @@
-from django.test import TestCase
+import json
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from account.models import User, CustomerFrame, CustomerGroup, Plan, PaymentMethod, Subscription
+from account.views import SubscriptionViewSet, UserProfileListApiView
+from lib.authentication import (
+    GenerationRefreshToken, current_token_generation, is_token_revoked, revoke_user_tokens, token_generation_key,
+)
+from lib.search import TrigramSearchFilter
+
+
+class CustomerGroupListQueryCountTests(APITestCase):
+    def setUp(self):
+        # The first lookup of a content type is a one-off query; keep it out of the counts
+        ContentType.objects.get_for_models(*apps.get_models())
+        self.admin = User.objects.create_user(email='admin@example.com', password='password', user_type='admin')
+        self.client.force_authenticate(self.admin)
+        self.created = 0
+        self.create_groups(2)
+
+    def create_groups(self, count):
+        for _ in range(count):
+            self.created += 1
+            group = CustomerGroup.objects.create(name=f'Group {self.created}')
+            CustomerFrame.objects.create(customer=self.admin, group=group)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_frame_count_is_annotated(self):
+        for url in ('/api/auth/customer-group-list', '/api/auth/customer-group'):
+            queries = self.count_queries(url)
+            self.create_groups(3)
+            self.assertEqual(self.count_queries(url), queries)
+
+    def test_group_list_is_streamed_in_envelope(self):
+        response = self.client.get('/api/auth/customer-group-list')
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((body['success'], body['status'], body['message']), (True, 200, 'Data'))
+        self.assertEqual([group['name'] for group in body['results']], ['Group 1', 'Group 2'])
+
+    def test_limit_all_is_streamed_with_count(self):
+        response = self.client.get('/api/auth/user-profile', {'limit': 'all'})
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((body['count'], body['next'], body['previous']), (1, None, None))
+        self.assertEqual([user['email'] for user in body['results']], ['admin@example.com'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MobileDashboardTests(APITestCase):
+    url = '/api/auth/mobile-dashboard'
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='customer@example.com', password='password', user_type='customer')
+        self.client.force_authenticate(self.user)
+        Subscription.objects.create(
+            user=self.user, plan=Plan.objects.create(name='Yearly', duration_in_months=12),
+            payment_method=PaymentMethod.objects.create(name='UPI'),
+            start_date=date.today(), end_date=date.today() + timedelta(days=30),
+        )
+
+    def test_cached_dashboard_runs_no_query(self):
+        self.assertEqual(self.client.get(self.url).data['days_left'], 30)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_unchanged_dashboard_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class TrigramSearchFilterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='ravi.patel@example.com', password='password', user_type='customer',
+            whatsapp_number='9876543210', is_verify=True,
+        )
+        self.other = User.objects.create_user(
+            email='meera@example.com', password='password', user_type='customer', whatsapp_number='9123456780',
+        )
+        self.subscription = Subscription.objects.create(
+            user=self.user, plan=Plan.objects.create(name='Yearly', duration_in_months=12),
+            payment_method=PaymentMethod.objects.create(name='UPI'), transaction_number='TXN_100%',
+            start_date=date.today(), end_date=date.today() + timedelta(days=30),
+        )
+
+    def search(self, queryset, view, term):
+        request = Request(APIRequestFactory().get('/', {'search': term}))
+        return list(TrigramSearchFilter().filter_queryset(request, queryset, view))
+
+    def test_text_fields_match_case_insensitive_substrings(self):
+        self.assertEqual(self.search(User.objects.all(), UserProfileListApiView, 'PATEL'), [self.user])
+        self.assertEqual(self.search(User.objects.all(), UserProfileListApiView, '654321'), [self.user])
+
+    def test_boolean_terms_match_exactly(self):
+        self.assertEqual(self.search(User.objects.all(), UserProfileListApiView, 'true'), [self.user])
+
+    def test_joined_fields_and_wildcards(self):
+        subscriptions = Subscription.objects.all()
+        self.assertEqual(self.search(subscriptions, SubscriptionViewSet, '98765'), [self.subscription])
+        self.assertEqual(self.search(subscriptions, SubscriptionViewSet, 'yearly'), [self.subscription])
+        self.assertEqual(self.search(subscriptions, SubscriptionViewSet, '100%'), [self.subscription])
+        self.assertEqual(self.search(subscriptions, SubscriptionViewSet, '_100'), [self.subscription])
+        self.assertEqual(self.search(subscriptions, SubscriptionViewSet, 'TXN%100'), [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='customer@example.com', password='password', user_type='customer')
+        self.access = str(GenerationRefreshToken.for_user(self.user).access_token)
+
+    def test_revoked_generation_is_published_on_commit(self):
+        self.assertEqual(current_token_generation(self.user.id), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_user_tokens(self.user.id)
+            # A concurrent request cached the old generation before the commit
+            cache.set(token_generation_key(self.user.id), 0, None)
+        self.assertEqual(current_token_generation(self.user.id), 1)
+
+        response = self.client.get('/api/auth/user-profile', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_login_in_the_second_of_a_global_revocation_is_kept(self):
+        # iat has whole seconds; the epoch has fractions
+        self.assertFalse(is_token_revoked({'gen': 0, 'iat': 12}, 0, 12.3))
+        self.assertTrue(is_token_revoked({'gen': 0, 'iat': 11}, 0, 12.3))
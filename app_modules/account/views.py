@@ -1,26 +1,27 @@
 from datetime import date, timedelta
-from django.db.models import Prefetch, F, Value, BooleanField, Case, When, Q, ExpressionWrapper
+from django.db.models import F, ExpressionWrapper, Count
 
 from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
 from django.forms import IntegerField
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, viewsets, exceptions, status
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
-from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 
-from app_modules.post.models import Post, Category
-from app_modules.post.serializers import BusinessCategorySerializer
+from app_modules.master import stats
+from app_modules.master.outbox import queue_email
+from lib.authentication import GenerationRefreshToken, revoke_user_tokens
 from lib.constants import UserConstants
-from lib.viewsets import BaseModelViewSet
+from lib.response import compute_etag, not_modified
+from lib.search import TrigramSearchFilter
+from lib.viewsets import BaseModelViewSet, StreamingListMixin
 from .filters import CustomerFrameFilter
+from .profile import get_login_profile, get_mobile_dashboard
 from .models import CustomerFrame, User, CustomerGroup, PaymentMethod, Plan, Subscription, UserCode
 from .serializers import (
     CustomerRegistrationSerializer, AdminRegistrationSerializer, CustomerFrameSerializer, SubscriptionSerializer,
@@ -54,70 +55,35 @@ class LoginView(APIView):
     def post(self, request):
         email = request.data.get('email')
         password = request.data.get('password')
-        
-        user_exists = User.objects.filter(email=email).first()
-        if user_exists and user_exists.is_deleted:
-            raise exceptions.ValidationError(
-                {'email': 'This account has been deleted. Please contact support for assistance.'}
-            )
 
         user = authenticate(request, username=email, password=password)
-        if user is None:
+        if user is None or user.is_deleted:
+            # Only failed logins pay for the deleted-account lookup
+            if user or User.objects.filter(email=email, is_deleted=True).exists():
+                raise exceptions.ValidationError(
+                    {'email': 'This account has been deleted. Please contact support for assistance.'}
+                )
             raise exceptions.ValidationError({'email': 'Invalid Email and Password'})
 
-        refresh = RefreshToken.for_user(user)
+        refresh = GenerationRefreshToken.for_user(user)
         current_date = timezone.now().date()
-
-        # Fetch user data with annotations and related frames
-        user_data = (
-            User.objects.filter(id=user.id)
-            .annotate(
-                is_customer=Case(
-                    When(no_of_post__lte=1, then=Value(True)),
-                    default=Value(False),
-                    output_field=BooleanField()
-                ),
-                is_expired=Case(
-                    When(
-                        Q(subscription_users__end_date__lt=current_date) | Q(subscription_users__isnull=True), 
-                        then=Value(True)
-                    ),
-                    default=Value(False),
-                    output_field=BooleanField()
-                ),
-            )
-            .prefetch_related(
-                Prefetch(
-                    'customer_frame',
-                    queryset=CustomerFrame.objects.select_related('business_category').order_by('business_category__id').distinct(),
-                    to_attr='frames'
-                )
-            )
-            .first()
-        )
+        profile = get_login_profile(user)
 
         # Calculate days left in subscription
-        subscription = user.subscription_users.first()
-        days_left = (subscription.end_date - current_date).days if subscription and subscription.end_date >= current_date else 0
-
-        # Organize frames by profession type with full thumbnail URLs
-        profession_types = {}
-        for frame in user_data.frames:
-            category = frame.business_category
-            if category:
-                profession_type = frame.profession_type
-                thumbnail_url = request.build_absolute_uri(category.thumbnail.url) if category.thumbnail else None
-                category_data = {
-                    "id": category.id,
-                    "business_sub_category_name": category.name,
-                    "file": thumbnail_url
-                }
-                if profession_type not in profession_types:
-                    profession_types[profession_type] = {"name": profession_type, "categories": []}
-                profession_types[profession_type]["categories"].append(category_data)
-
-        # Convert profession_types dictionary to a list for response
-        profession_types_list = list(profession_types.values())
+        end_date = profile['subscription_end_date']
+        is_expired = end_date is None or end_date < current_date
+        days_left = 0 if is_expired else (end_date - current_date).days
+
+        profession_types = [
+            {
+                **profession_type,
+                'categories': [
+                    {**category, 'file': request.build_absolute_uri(category['file']) if category['file'] else None}
+                    for category in profession_type['categories']
+                ],
+            }
+            for profession_type in profile['profession_types']
+        ]
 
         return Response({
             'refresh': str(refresh),
@@ -125,11 +91,11 @@ class LoginView(APIView):
             'id': user.id,
             'is_verify': user.is_verify,
             'mobile_number': user.whatsapp_number,
-            'is_customer': user_data.is_customer,
-            'is_a_group': bool(user_data.frames and user_data.frames[0].is_a_group()),
-            'is_expired': user_data.is_expired,
+            'is_customer': user.no_of_post <= 1,
+            'is_a_group': profile['is_a_group'],
+            'is_expired': is_expired,
             'days_left': days_left,
-            'profession_types': profession_types_list  # List with profession type and associated categories
+            'profession_types': profession_types  # List with profession type and associated categories
         })
 
        
@@ -137,32 +103,16 @@ class LogoutAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
-        try:
-            user = request.user
-
-            # Retrieve all refresh tokens and access tokens for the user
-            refresh_tokens = RefreshToken.objects.filter(user=user)
-            access_tokens = AccessToken.objects.filter(user=user)
-
-            # Blacklist each refresh token
-            for r_token in refresh_tokens:
-                BlacklistedToken.objects.get_or_create(token=r_token)
-            
-            # Blacklist each access token
-            for a_token in access_tokens:
-                BlacklistedToken.objects.get_or_create(token=a_token)
-
-            return Response({"details": "Logged Out"})
-
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # One UPDATE revokes every refresh and access token of the user
+        revoke_user_tokens(request.user.id)
+        return Response({"details": "Logged Out"})
 
 
 class CustomerFrameViewSet(viewsets.ModelViewSet):
     queryset = CustomerFrame.objects.select_related(
-        'customer', 'business_category', 'group').all().order_by('-id')
+        'customer', 'business_category', 'group').prefetch_related('renditions').order_by('-id')
     serializer_class = CustomerFrameSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     search_fields = [
         'group__name', 'customer__whatsapp_number', 'display_name'
     ]
@@ -172,10 +122,11 @@ class CustomerFrameViewSet(viewsets.ModelViewSet):
 
 class UserProfileListApiView(BaseModelViewSet):
     serializer_class = UserProfileListSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, OrderingFilter]
     search_fields = [
         'first_name', 'last_name', 'email', 'whatsapp_number', 'is_verify', 'is_deleted'
         ]
+    keyset_ordering = ('-id',)
 
     def get_queryset(self):
         data = self.request.query_params.get('data', None)
@@ -241,7 +192,8 @@ class SendOTP(APIView):
         recipient_list = [
             user.email,
         ]
-        send_mail(subject, message, email_from, recipient_list, fail_silently=True)
+        # Delivered by the outbox worker; the request does not wait for SMTP
+        queue_email(subject, message, recipient_list, from_email=email_from)
 
         response_data = {"message": "Email OTP sent successfully."}
         return Response(data=response_data, status=status.HTTP_200_OK)
@@ -294,28 +246,28 @@ class SetNewPassword(APIView):
 
 
 class CustomerGroupViewSet(viewsets.ModelViewSet):
-    queryset = CustomerGroup.objects.all().order_by('name')
+    queryset = CustomerGroup.objects.annotate(frame_count=Count('customer_frame_group')).order_by('name')
     serializer_class = CustomerGroupSerializer
 
 
-class CustomerGroupListApiView(ListAPIView):
+class CustomerGroupListApiView(StreamingListMixin, ListAPIView):
     pagination_class = None
-    queryset = CustomerGroup.objects.all().order_by('name')
+    queryset = CustomerGroup.objects.annotate(frame_count=Count('customer_frame_group')).order_by('name')
     serializer_class = CustomerGroupSerializer
 
 
-class CustomerFrameListApiView(ListAPIView):
+class CustomerFrameListApiView(StreamingListMixin, ListAPIView):
     pagination_class = None
     serializer_class = CustomerFrameSerializer
     queryset = CustomerFrame.objects.select_related(
-        'customer', 'business_category', 'group').all()
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+        'customer', 'business_category', 'group').prefetch_related('renditions')
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, OrderingFilter]
     search_fields = [
         'customer__whatsapp_number'
     ]
 
 
-class CustomerListApiView(ListAPIView):
+class CustomerListApiView(StreamingListMixin, ListAPIView):
     pagination_class = None
     queryset = User.objects.all().order_by('-id')
     serializer_class = CuatomerListSerializer
@@ -335,7 +287,7 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
 
 class SubscriptionViewSet(BaseModelViewSet):
     serializer_class = SubscriptionSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, OrderingFilter]
     search_fields = [
         'order_number', 'user__whatsapp_number', 'frame__display_name', 'transaction_number',
         'payment_method__name', 'plan__name'
@@ -370,22 +322,21 @@ class SubscriptionViewSet(BaseModelViewSet):
 class DashboardApi(APIView):
 
     def get(self, request, *args, **kwargs):
-        total_customer_count = User.objects.filter(user_type="customer", no_of_post__lte=1).count()
-        total_post_count = Post.objects.select_related('event', 'group').count()
-        total_resaller_count = User.objects.filter(no_of_post__gt=1, user_type="customer").count()
-        total_category_count = Category.objects.filter(sub_category__isnull=True).count()
-        total_sub_category_count = Category.objects.filter(sub_category__isnull=False).count()
+        # Pre-aggregated by app_modules.master.stats; one indexed read
+        counts = stats.totals([
+            stats.CUSTOMERS, stats.POSTS, stats.RESELLERS, stats.CATEGORIES, stats.SUB_CATEGORIES,
+            stats.VERIFIED_CUSTOMERS, stats.UNVERIFIED_CUSTOMERS, stats.EXPIRED_SUBSCRIPTIONS,
+        ])
 
         data = {
-            'total_customer_count': total_customer_count,
-            'total_post_count': total_post_count,
-            'total_resaller_count': total_resaller_count,
-            'total_category_count': total_category_count,
-            'total_sub_category_count': total_sub_category_count,
-            # 'total_active_customer_count':
-            # 'total_inactive_customer_count': 
-            # "expired_customer_subscription_count"
-
+            'total_customer_count': counts[stats.CUSTOMERS],
+            'total_post_count': counts[stats.POSTS],
+            'total_resaller_count': counts[stats.RESELLERS],
+            'total_category_count': counts[stats.CATEGORIES],
+            'total_sub_category_count': counts[stats.SUB_CATEGORIES],
+            'total_active_customer_count': counts[stats.VERIFIED_CUSTOMERS],
+            'total_inactive_customer_count': counts[stats.UNVERIFIED_CUSTOMERS],
+            'expired_customer_subscription_count': counts[stats.EXPIRED_SUBSCRIPTIONS],
         }
 
         return Response(data)
@@ -395,38 +346,27 @@ class MobileDashboardApi(APIView):
     def get(self, request, *args, **kwargs):
         user = request.user
         current_date = date.today()
+        dashboard = get_mobile_dashboard(user)
 
-        expired_subscription = Subscription.objects.filter(end_date__lt=current_date, user=user).exists()
-        if expired_subscription:
-            is_expired = True
-            days_left = None
-        else:
-            is_expired = False
-            if user.subscription_users.exists():
-                subscription = user.subscription_users.latest('end_date')
-                days_left = (subscription.end_date - current_date).days
-            else:
-                days_left = None
-
-        # Retrieve the categories assigned to the user's CustomerFrame objects
-        user_customer_frames = CustomerFrame.objects.filter(customer=user)
-        assigned_business_categories = []
-        for frame in user_customer_frames:
-            if frame.business_category:
-                assigned_business_categories.append(frame.business_category)
-
-        # Serialize the assigned business categories
-        category_serializer = BusinessCategorySerializer(assigned_business_categories, many=True)
+        first_end_date, last_end_date = dashboard['first_end_date'], dashboard['last_end_date']
+        is_expired = first_end_date is not None and first_end_date < current_date
+        days_left = (last_end_date - current_date).days if last_end_date and not is_expired else None
 
         data = {
             'id': user.id,
             'is_verify': user.is_verify,
             'is_expired': is_expired,
             'days_left': days_left,
-            'assigned_business_categories': category_serializer.data,
+            'assigned_business_categories': dashboard['assigned_business_categories'],
         }
 
-        return Response(data)
+        # The app calls this on every launch; an unchanged dashboard costs a 304
+        etag = compute_etag(data)
+        response = not_modified(request, etag)
+        if response is None:
+            response = Response(data)
+            response['ETag'] = etag
+        return response
 
 
 class ChangeUserPasswordServiceApiView(APIView):
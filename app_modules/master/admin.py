@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from app_modules.master.models import (
-    Banner, BirthdayPost, SplashScreen, Tutorials, About, PrivacyPolicy, TermsAndCondition, Feedback,
+    Banner, BirthdayPost, SplashScreen, Tutorials, About, PrivacyPolicy, TermsAndCondition, Feedback, OutgoingEmail,
 )
 
 admin.site.register(BirthdayPost)
@@ -13,3 +13,8 @@ admin.site.register(PrivacyPolicy)
 admin.site.register(TermsAndCondition)
 admin.site.register(Feedback)
 
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
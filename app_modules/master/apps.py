@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MasterConfig(AppConfig):
     name = 'app_modules.master'
+
+    def ready(self):
+        import app_modules.master.signal
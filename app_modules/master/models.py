@@ -1,6 +1,9 @@
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.utils import timezone
 
-from lib.helpers import rename_file_name, converter_to_webp
+from lib.helpers import rename_file_name
 from lib.models import BaseModel
 
 
@@ -47,8 +50,89 @@ class Feedback(BaseModel):
     
     def __str__(self) -> str:
         return self.customer.whatsapp_number
-    
 
 
+class ImageRendition(BaseModel):
+    """
+    A resized, re-encoded copy of an uploaded image, generated in the
+    background by lib.images for every model listing the field in
+    ``rendition_fields``.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    field_name = models.CharField(max_length=50)
+    # Name of the original file the rendition was made from
+    source_name = models.CharField(max_length=255)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(upload_to=rename_file_name('renditions/'))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'field_name']),
+        ]
 
+    def __str__(self) -> str:
+        return f"{self.field_name} {self.format} {self.width}w"
+
+
+class OutgoingEmail(BaseModel):
+    """
+    An email waiting in the outbox, delivered in batches by
+    app_modules.master.outbox.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS = (
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, null=True, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When the email is due; while sending, when the delivery lease runs out
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
 
+    def __str__(self) -> str:
+        return f"{self.subject} to {', '.join(self.recipients)} ({self.status})"
+
+
+class StatRollup(models.Model):
+    """
+    Pre-aggregated statistic maintained by app_modules.master.stats: the
+    running total of ``metric`` when ``day`` is null, else its value for that
+    day.
+    """
+    metric = models.CharField(max_length=50)
+    day = models.DateField(null=True, blank=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['metric'], condition=models.Q(day__isnull=True), name='unique_stat_rollup_total'
+            ),
+            models.UniqueConstraint(
+                fields=['metric', 'day'], condition=models.Q(day__isnull=False), name='unique_stat_rollup_day'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.metric} {self.day or 'total'}: {self.value}"
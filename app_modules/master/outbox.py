@@ -0,0 +1,109 @@
+"""
+Email outbox.
+
+Requests only insert an ``OutgoingEmail`` row; a Celery worker delivers due
+emails in batches over a single connection of the configured EMAIL_BACKEND.
+Rows are claimed with ``SKIP LOCKED`` and a lease, so concurrent workers never
+send the same email and emails of a crashed worker are picked up again once
+the lease runs out. Failed emails are retried with exponential backoff.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+EMAIL_BATCH_SIZE = 50
+EMAIL_MAX_ATTEMPTS = 5
+# Backoff after the n-th failed attempt: EMAIL_RETRY_DELAY * 2 ** (n - 1)
+EMAIL_RETRY_DELAY = datetime.timedelta(minutes=1)
+# How long a worker may take to deliver a claimed batch
+EMAIL_DELIVERY_LEASE = datetime.timedelta(minutes=10)
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    """
+    Add an email to the outbox and trigger delivery once the surrounding
+    transaction commits.
+    """
+    from .tasks import deliver_outgoing_emails
+
+    email = OutgoingEmail.objects.create(
+        subject=subject, body=body, recipients=list(recipients),
+        from_email=from_email or settings.EMAIL_HOST_USER,
+    )
+    transaction.on_commit(deliver_outgoing_emails.delay)
+    return email
+
+
+def claim_batch(batch_size=EMAIL_BATCH_SIZE):
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutgoingEmail.objects.filter(
+                Q(status=OutgoingEmail.PENDING) | Q(status=OutgoingEmail.SENDING),
+                next_attempt_at__lte=now,
+            )
+            .order_by('next_attempt_at')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        OutgoingEmail.objects.filter(id__in=ids).update(
+            status=OutgoingEmail.SENDING, next_attempt_at=now + EMAIL_DELIVERY_LEASE, modified=now
+        )
+    return list(OutgoingEmail.objects.filter(id__in=ids).order_by('id'))
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= EMAIL_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.status = OutgoingEmail.PENDING
+        email.next_attempt_at = timezone.now() + EMAIL_RETRY_DELAY * 2 ** (email.attempts - 1)
+    email.save()
+
+
+def deliver_batch(batch_size=EMAIL_BATCH_SIZE):
+    """
+    Deliver one batch of due emails. Returns ``(sent, failed, claimed)``.
+    """
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for email in emails:
+            _record_failure(email, error)
+        return 0, len(emails), len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, email.recipients, connection=connection
+            )
+            try:
+                message.send()
+            except Exception as error:
+                _record_failure(email, error)
+                failed += 1
+            else:
+                email.status = OutgoingEmail.SENT
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.last_error = None
+                email.save()
+                sent += 1
+    finally:
+        connection.close()
+
+    return sent, failed, len(emails)
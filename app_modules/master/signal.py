@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from lib.dispatch import on_commit_batch, register_reconciler, suspendable
+from lib.images import is_image_file
+from .models import StatRollup
+from .stats import TRACKED, apply_changes, changes_for_save, changes_for_delete, reconcile
+from .tasks import generate_image_renditions, reconcile_stat_rollups
+
+
+@receiver(post_save)
+def trigger_image_renditions(sender, instance, created, update_fields=None, **kwargs):
+    for field_name in getattr(sender, 'rendition_fields', ()):
+        if not is_image_file(getattr(instance, field_name)):
+            continue
+        if created or update_fields is None or field_name in update_fields:
+            transaction.on_commit(
+                lambda field_name=field_name: generate_image_renditions.delay(
+                    sender._meta.app_label, sender._meta.model_name, instance.pk, field_name
+                )
+            )
+
+
+def apply_merged_changes(batches):
+    merged = {}
+    for changes in batches:
+        for key, delta in changes.items():
+            merged[key] = merged.get(key, 0) + delta
+    apply_changes(merged)
+
+
+def apply_changes_on_commit(changes):
+    # A transaction saving many rows updates the rollups once
+    on_commit_batch('stat_rollups', changes, apply_merged_changes)
+
+
+@suspendable
+def update_stat_rollups(sender, instance, created, **kwargs):
+    # Computed now, while get_dirty_fields() still holds the loaded values
+    changes = changes_for_save(instance, created)
+    if changes:
+        apply_changes_on_commit(changes)
+
+
+@suspendable
+def remove_from_stat_rollups(sender, instance, **kwargs):
+    apply_changes_on_commit(changes_for_delete(instance))
+
+
+def recount_stat_rollups(touched):
+    reconcile_stat_rollups.delay()
+
+
+for tracked_model in TRACKED:
+    post_save.connect(update_stat_rollups, sender=tracked_model)
+    post_delete.connect(remove_from_stat_rollups, sender=tracked_model)
+register_reconciler(recount_stat_rollups, *TRACKED)
+
+
+@receiver(post_migrate)
+def seed_stat_rollups(sender, **kwargs):
+    # The rollups only receive deltas; start them from the current counts
+    if sender.label == StatRollup._meta.app_label:
+        reconcile()
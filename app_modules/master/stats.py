@@ -0,0 +1,250 @@
+"""
+Statistics rollups.
+
+Totals (customers, resellers, posts by file type, subscriptions, downloads,
+...) and daily series are kept in ``StatRollup`` rows, so dashboards read
+pre-aggregated values instead of counting tables.
+
+Rows are adjusted from post_save/post_delete signals: every tracked model
+classifies an instance into the totals it counts towards, and a save moves
+the instance from the totals of its loaded state to those of its new state.
+Raw SQL writes adjust the rollups themselves: frame syncs apply their
+downloads delta, and the past-event purge recounts once it is done. Anything
+else that bypasses signals (date based expiry) is corrected by
+``reconcile`` every night. ``reconcile`` also runs after every ``migrate``,
+so a fresh deploy starts from real counts rather than from zero.
+"""
+import datetime
+
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from account.models import User, Subscription
+from app_modules.post.models import (
+    Post, Category, CustomerPostFrameMapping, CustomerOtherPostFrameMapping, BusinessPostFrameMapping,
+)
+from .models import StatRollup
+
+CUSTOMERS = 'customers'
+RESELLERS = 'resellers'
+VERIFIED_CUSTOMERS = 'verified_customers'
+UNVERIFIED_CUSTOMERS = 'unverified_customers'
+POSTS = 'posts'
+CATEGORIES = 'categories'
+SUB_CATEGORIES = 'sub_categories'
+ACTIVE_SUBSCRIPTIONS = 'active_subscriptions'
+EXPIRED_SUBSCRIPTIONS = 'expired_subscriptions'
+DOWNLOADS = 'downloads'
+# Daily series
+CUSTOMERS_JOINED = 'customers_joined'
+POSTS_CREATED = 'posts_created'
+
+
+def posts_by_type(file_type):
+    return f'posts_{file_type}'
+
+
+def classify_user(values):
+    if values['user_type'] != 'customer':
+        return set()
+    # Verified customers are the dashboard's active customers, as in the
+    # user list's data=active / data=inactive filters
+    metrics = {VERIFIED_CUSTOMERS if values['is_verify'] else UNVERIFIED_CUSTOMERS}
+    metrics.add(CUSTOMERS if values['no_of_post'] <= 1 else RESELLERS)
+    return metrics
+
+
+def classify_post(values):
+    return {POSTS, posts_by_type(values['file_type'])}
+
+
+def classify_category(values):
+    return {CATEGORIES if values['sub_category'] is None else SUB_CATEGORIES}
+
+
+def classify_subscription(values):
+    return {EXPIRED_SUBSCRIPTIONS if values['end_date'] < timezone.localdate() else ACTIVE_SUBSCRIPTIONS}
+
+
+def classify_mapping(values):
+    return {DOWNLOADS} if values['is_downloaded'] else set()
+
+
+class Tracked:
+    """
+    How a model feeds the rollups: the fields ``classify`` reads, the daily
+    series bumped on create, and the totals that also get a daily series
+    when an instance enters them.
+    """
+
+    def __init__(self, fields, classify, created_series=None, daily_metrics=()):
+        self.fields = fields
+        self.classify = classify
+        self.created_series = created_series
+        self.daily_metrics = set(daily_metrics)
+
+
+TRACKED = {
+    User: Tracked(('user_type', 'is_verify', 'no_of_post'), classify_user, created_series=CUSTOMERS_JOINED),
+    Post: Tracked(('file_type',), classify_post, created_series=POSTS_CREATED),
+    Category: Tracked(('sub_category',), classify_category),
+    Subscription: Tracked(('end_date',), classify_subscription),
+    CustomerPostFrameMapping: Tracked(('is_downloaded',), classify_mapping, daily_metrics=(DOWNLOADS,)),
+    CustomerOtherPostFrameMapping: Tracked(('is_downloaded',), classify_mapping, daily_metrics=(DOWNLOADS,)),
+    BusinessPostFrameMapping: Tracked(('is_downloaded',), classify_mapping, daily_metrics=(DOWNLOADS,)),
+}
+
+
+def _values(instance, fields, previous=None):
+    previous = previous or {}
+    values = {}
+    for name in fields:
+        field = instance._meta.get_field(name)
+        values[name] = previous[name] if name in previous else getattr(instance, field.attname)
+    return values
+
+
+def changes_for_save(instance, created):
+    """
+    ``{(metric, day): delta}`` for saving ``instance``; call from post_save,
+    where ``get_dirty_fields()`` still holds the loaded values.
+    """
+    tracked = TRACKED[type(instance)]
+    new = tracked.classify(_values(instance, tracked.fields))
+    if created:
+        old = set()
+    else:
+        dirty = instance.get_dirty_fields()
+        if not dirty.keys() & set(tracked.fields):
+            return {}
+        old = tracked.classify(_values(instance, tracked.fields, previous=dirty))
+
+    today = timezone.localdate()
+    changes = {}
+    for metric in new - old:
+        changes[(metric, None)] = 1
+        if metric in tracked.daily_metrics:
+            changes[(metric, today)] = 1
+    for metric in old - new:
+        changes[(metric, None)] = -1
+    if created and tracked.created_series and new:
+        changes[(tracked.created_series, today)] = 1
+    return changes
+
+
+def changes_for_delete(instance):
+    tracked = TRACKED[type(instance)]
+    return {(metric, None): -1 for metric in tracked.classify(_values(instance, tracked.fields))}
+
+
+def apply_changes(changes):
+    """
+    Add the deltas to their rollup rows, creating missing rows, in one
+    statement per row kind.
+    """
+    if not changes:
+        return
+    deltas = [(metric, day, delta) for (metric, day), delta in changes.items() if delta]
+    table = StatRollup._meta.db_table
+    with connection.cursor() as cursor:
+        for is_total in (True, False):
+            rows = [row for row in deltas if (row[1] is None) == is_total]
+            if not rows:
+                continue
+            conflict = '(metric) WHERE day IS NULL' if is_total else '(metric, day) WHERE day IS NOT NULL'
+            placeholders = ', '.join(['(%s, %s::date, %s)'] * len(rows))
+            cursor.execute(
+                f'INSERT INTO {table} (metric, day, value) VALUES {placeholders} '
+                f'ON CONFLICT {conflict} DO UPDATE SET value = {table}.value + EXCLUDED.value',
+                [value for row in rows for value in row]
+            )
+
+
+def totals(metrics):
+    """
+    ``{metric: total}`` for the given metrics in one query; missing rows are 0.
+    """
+    values = dict(
+        StatRollup.objects.filter(day__isnull=True, metric__in=metrics).values_list('metric', 'value')
+    )
+    return {metric: values.get(metric, 0) for metric in metrics}
+
+
+def series(metric, start, end):
+    """
+    ``[(day, value)]`` of a daily series from ``start`` to ``end`` inclusive,
+    with missing days as 0.
+    """
+    values = dict(
+        StatRollup.objects.filter(metric=metric, day__range=(start, end)).values_list('day', 'value')
+    )
+    return [
+        (start + datetime.timedelta(days=offset), values.get(start + datetime.timedelta(days=offset), 0))
+        for offset in range((end - start).days + 1)
+    ]
+
+
+def _set_values(rows):
+    """
+    Overwrite rollup rows with recounted values: ``{(metric, day): value}``.
+    """
+    for (metric, day), value in rows.items():
+        StatRollup.objects.update_or_create(metric=metric, day=day, defaults={'value': value})
+
+
+def reconcile(days=2):
+    """
+    Recount every total, and the created-based series of the last ``days``
+    days, from the source tables.
+    """
+    today = timezone.localdate()
+    customers = User.objects.filter(user_type='customer').aggregate(
+        customers=Count('id', filter=Q(no_of_post__lte=1)),
+        resellers=Count('id', filter=Q(no_of_post__gt=1)),
+        verified=Count('id', filter=Q(is_verify=True)),
+        unverified=Count('id', filter=Q(is_verify=False)),
+    )
+    categories = Category.objects.aggregate(
+        categories=Count('id', filter=Q(sub_category__isnull=True)),
+        sub_categories=Count('id', filter=Q(sub_category__isnull=False)),
+    )
+    subscriptions = Subscription.objects.aggregate(
+        active=Count('id', filter=Q(end_date__gte=today)),
+        expired=Count('id', filter=Q(end_date__lt=today)),
+    )
+    downloads = sum(
+        model.objects.filter(is_downloaded=True).count()
+        for model in (CustomerPostFrameMapping, CustomerOtherPostFrameMapping, BusinessPostFrameMapping)
+    )
+
+    rows = {
+        (CUSTOMERS, None): customers['customers'],
+        (RESELLERS, None): customers['resellers'],
+        (VERIFIED_CUSTOMERS, None): customers['verified'],
+        (UNVERIFIED_CUSTOMERS, None): customers['unverified'],
+        (POSTS, None): Post.objects.count(),
+        (CATEGORIES, None): categories['categories'],
+        (SUB_CATEGORIES, None): categories['sub_categories'],
+        (ACTIVE_SUBSCRIPTIONS, None): subscriptions['active'],
+        (EXPIRED_SUBSCRIPTIONS, None): subscriptions['expired'],
+        (DOWNLOADS, None): downloads,
+    }
+    for file_type, _ in Post._meta.get_field('file_type').choices:
+        rows[(posts_by_type(file_type), None)] = 0
+    for file_type, count in Post.objects.order_by().values_list('file_type').annotate(count=Count('id')):
+        rows[(posts_by_type(file_type), None)] = count
+
+    since = today - datetime.timedelta(days=days - 1)
+    for metric, queryset in (
+        (CUSTOMERS_JOINED, User.objects.filter(user_type='customer')),
+        (POSTS_CREATED, Post.objects.all()),
+    ):
+        for day in range(days):
+            rows[(metric, since + datetime.timedelta(days=day))] = 0
+        created = queryset.filter(created__date__gte=since).order_by().values_list('created__date')
+        for day, count in created.annotate(count=Count('id')):
+            rows[(metric, day)] = count
+
+    _set_values(rows)
+    return rows
@@ -0,0 +1,75 @@
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from django_celery_results.models import TaskResult
+
+from lib.batches import delete_in_batches
+from lib.dispatch import Coalescer
+from lib.images import build_renditions
+from lib.video import stored_metadata
+from .outbox import EMAIL_BATCH_SIZE, deliver_batch
+from .stats import reconcile
+
+
+@shared_task
+def generate_image_renditions(app_label, model_name, object_id, field_name):
+    model = apps.get_model(app_label, model_name)
+    try:
+        instance = model.objects.get(pk=object_id)
+    except model.DoesNotExist:
+        return f"{model.__name__} with id {object_id} does not exist."
+
+    renditions = build_renditions(instance, field_name)
+    return f"Created {len(renditions)} renditions for {model.__name__} {object_id} {field_name}."
+
+
+@shared_task
+def store_media_metadata(app_label, model_name, object_id, field_name, fields):
+    model = apps.get_model(app_label, model_name)
+    name = model.objects.filter(pk=object_id).values_list(field_name, flat=True).first()
+    if not name:
+        return f"{model.__name__} with id {object_id} has no {field_name}."
+
+    storage = model._meta.get_field(field_name).storage
+    metadata = stored_metadata(storage.path(name), fields=fields)
+    if not metadata:
+        return f"Could not probe {name}."
+
+    # Skipped if the file was replaced meanwhile; the new file has its own task
+    model.objects.filter(pk=object_id, **{field_name: name}).update(**metadata)
+    return f"Stored {field_name} metadata of {model.__name__} {object_id}."
+
+
+@shared_task
+def deliver_outgoing_emails():
+    sent, failed, claimed = deliver_batch()
+    if claimed == EMAIL_BATCH_SIZE:
+        # More emails may be due; keep draining in a fresh task
+        deliver_outgoing_emails.delay()
+    return f"Sent {sent} emails, {failed} failed."
+
+
+@shared_task
+def run_coalesced_batch(name, targets=None):
+    # Without targets the batch takes whatever is waiting in the coalescer's window
+    result = Coalescer.registry[name].run(targets)
+    return f"Ran {name}: {result}"
+
+
+@shared_task
+def reconcile_stat_rollups():
+    rows = reconcile()
+    return f"Reconciled {len(rows)} statistics."
+
+
+@shared_task
+def prune_task_results():
+    # Batched by id range, so the DELETE never holds locks on the whole table
+    deleted = sum(
+        len(rows) for rows in delete_in_batches(
+            TaskResult._meta.db_table, 't.date_done < %(cutoff)s',
+            {'cutoff': timezone.now() - settings.TASK_RESULT_MAX_AGE}, returning='t.id',
+        )
+    )
+    return f"Pruned {deleted} task results."
@@ -1,3 +1,206 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core import mail
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_celery_results.models import TaskResult
+
+from account.models import User
+from lib.dispatch import bulk_import, on_commit_batch
+from lib.metrics import Histogram, histogram_quantile, parse_sample, registry, render
+from . import stats
+from .models import Tutorials, OutgoingEmail
+from .outbox import EMAIL_MAX_ATTEMPTS, deliver_batch
+from .signal import seed_stat_rollups
+from .tasks import prune_task_results
+
+
+class BaseModelDirtyTrackingTests(TestCase):
+    def setUp(self):
+        Tutorials.objects.create(name='Intro', url='https://example.com/intro')
+        self.tutorial = Tutorials.objects.get()
+
+    def test_unchanged_save_runs_no_query(self):
+        with CaptureQueriesContext(connection) as context:
+            self.tutorial.save()
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_update_saves_changed_fields_only(self):
+        self.tutorial.name = 'Basics'
+        self.assertEqual(self.tutorial.get_dirty_fields(), {'name': 'Intro'})
+
+        with CaptureQueriesContext(connection) as context:
+            self.tutorial.save()
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn('"url"', context.captured_queries[0]['sql'])
+        self.assertEqual(self.tutorial.get_dirty_fields(), {})
+        self.assertEqual(Tutorials.objects.get().name, 'Basics')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxDeliveryTests(TestCase):
+    def create_email(self, **kwargs):
+        return OutgoingEmail.objects.create(
+            subject='OTP', body='1234', from_email='noreply@example.com', recipients=['a@example.com'], **kwargs
+        )
+
+    def test_batch_is_delivered_and_recorded(self):
+        for _ in range(3):
+            self.create_email()
+
+        self.assertEqual(deliver_batch(), (3, 0, 3))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 3)
+        self.assertEqual(deliver_batch(), (0, 0, 0))
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1', EMAIL_PORT=1)
+    def test_failures_back_off_then_give_up(self):
+        email = self.create_email(attempts=EMAIL_MAX_ATTEMPTS - 2)
+
+        self.assertEqual(deliver_batch(), (0, 1, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+        self.assertEqual(deliver_batch(), (0, 0, 0))
+
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=email.created)
+        deliver_batch()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+
+
+class StatRollupTests(TestCase):
+    def test_signals_move_users_between_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user(email='a@example.com', password='password', user_type='customer')
+        self.assertEqual(stats.totals([stats.CUSTOMERS, stats.RESELLERS]), {stats.CUSTOMERS: 1, stats.RESELLERS: 0})
+
+        user = User.objects.get(pk=user.pk)
+        user.no_of_post = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(stats.totals([stats.CUSTOMERS, stats.RESELLERS]), {stats.CUSTOMERS: 0, stats.RESELLERS: 1})
+
+    def test_migrate_seeds_rollups(self):
+        # bulk_create sends no signals, like rows that existed before the rollups
+        User.objects.bulk_create([User(email='a@example.com', user_type='customer')])
+        seed_stat_rollups(sender=apps.get_app_config('master'))
+        self.assertEqual(stats.totals([stats.CUSTOMERS])[stats.CUSTOMERS], 1)
+
+    def test_reconcile_recounts_totals(self):
+        User.objects.create_user(email='a@example.com', password='password', user_type='customer')
+        stats.reconcile()
+        self.assertEqual(stats.totals([stats.CUSTOMERS])[stats.CUSTOMERS], 1)
+
+
+    def test_saves_in_one_transaction_are_applied_together(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(3):
+                User.objects.create_user(email=f'{n}@example.com', password='password', user_type='customer')
+        self.assertEqual(stats.totals([stats.CUSTOMERS])[stats.CUSTOMERS], 3)
+
+
+class DispatchTests(TestCase):
+    def test_batch_flushes_once_on_commit(self):
+        flushed = []
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for item in range(3):
+                on_commit_batch('test', item, flushed.append)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(flushed, [[0, 1, 2]])
+
+    def test_rolled_back_items_are_not_flushed(self):
+        flushed = []
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    on_commit_batch('test', 1, flushed.append)
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+            on_commit_batch('test', 2, flushed.append)
+        self.assertEqual(flushed, [[2]])
+
+    def test_items_of_a_rolled_back_savepoint_leave_the_outer_batch(self):
+        flushed = []
+        with self.captureOnCommitCallbacks(execute=True):
+            on_commit_batch('test', 1, flushed.append)
+            try:
+                with transaction.atomic():
+                    on_commit_batch('test', 2, flushed.append)
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+            with transaction.atomic():
+                on_commit_batch('test', 3, flushed.append)
+        self.assertEqual(sorted(item for batch in flushed for item in batch), [1, 3])
+
+    @mock.patch('app_modules.master.signal.reconcile_stat_rollups')
+    def test_bulk_import_reconciles_once(self, reconcile_stat_rollups):
+        with self.captureOnCommitCallbacks(execute=True):
+            with bulk_import():
+                for n in range(3):
+                    User.objects.create_user(email=f'{n}@example.com', password='password', user_type='customer')
+        # The per-row receivers were suspended; one recount was queued instead
+        self.assertEqual(stats.totals([stats.CUSTOMERS])[stats.CUSTOMERS], 0)
+        reconcile_stat_rollups.delay.assert_called_once_with()
+
+
+class APILoggingMiddlewareTests(TestCase):
+    @override_settings(REQUEST_LOG_SAMPLE_RATE=1.0, REQUEST_LOG_HEADERS=['User-Agent'])
+    def test_only_allow_listed_headers_are_logged(self):
+        with self.assertLogs('api.requests', level='INFO') as logs:
+            self.client.get('/api/missing', HTTP_USER_AGENT='app/1.0', HTTP_AUTHORIZATION='Bearer secret')
+        record = logs.records[0]
+        self.assertEqual((record.path, record.status_code), ('/api/missing', 404))
+        self.assertEqual(record.headers, {'User-Agent': 'app/1.0'})
+
+    @override_settings(REQUEST_LOG_SAMPLE_RATE=0.0)
+    def test_unsampled_successful_requests_are_not_logged(self):
+        with self.assertNoLogs('api.requests', level='INFO'):
+            response = self.client.get('/admin/login/')
+        self.assertEqual(response.status_code, 200)
+
+
+class MetricsTests(TestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram('test_latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, 'api/post/')
+        samples = {
+            sample: value for sample, value in registry.pending.items() if sample.startswith('test_latency_seconds')
+        }
+        text = render({'test_latency_seconds': 'histogram|Latency.'}, samples)
+        self.assertIn('# TYPE test_latency_seconds histogram', text)
+        self.assertIn('test_latency_seconds_bucket{route="api/post/",le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{route="api/post/",le="1.0"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{route="api/post/",le="+Inf"} 3', text)
+        self.assertIn('test_latency_seconds_count{route="api/post/"} 3', text)
+        self.assertLess(text.index('le="0.1"'), text.index('le="1.0"'))
+
+    def test_task_summary_helpers(self):
+        self.assertEqual(
+            parse_sample('celery_task_run_seconds_bucket{task="post.map",le="+Inf"}'),
+            ('celery_task_run_seconds_bucket', {'task': 'post.map', 'le': '+Inf'})
+        )
+        buckets = [(1.0, 2), (5.0, 4), (float('inf'), 4)]
+        self.assertEqual(histogram_quantile(0.5, buckets), 1.0)
+        self.assertAlmostEqual(histogram_quantile(0.95, buckets), 4.6)
+
+    def test_metrics_are_admin_only(self):
+        user = User.objects.create_user(email='customer@example.com', password='password', user_type='customer')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+class PruneTaskResultsTests(TestCase):
+    def test_only_old_results_are_pruned(self):
+        old = TaskResult.objects.create(task_id='old', status='SUCCESS')
+        recent = TaskResult.objects.create(task_id='recent', status='SUCCESS')
+        TaskResult.objects.filter(pk=old.pk).update(date_done=timezone.now() - datetime.timedelta(days=30))
+
+        self.assertEqual(prune_task_results(), "Pruned 1 task results.")
+        self.assertEqual(list(TaskResult.objects.values_list('pk', flat=True)), [recent.pk])
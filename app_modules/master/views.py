@@ -1,14 +1,19 @@
+from django.http import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.views import APIView
 
 from app_modules.master import serializers
 from app_modules.master.models import (
     Banner, BirthdayPost, SplashScreen, Tutorials, About, PrivacyPolicy, TermsAndCondition, Feedback,
 )
+from lib.authentication import CachedJWTAuthentication
+from lib.metrics import registry, render
 from lib.viewsets import BaseModelViewSet
 
 
@@ -76,4 +81,16 @@ class FeedbackViewSet(BaseModelViewSet):
     http_method_names = ['get', 'post']
     
     def perform_create(self, serializer):
-        serializer.save(customer=self.request.user)
\ No newline at end of file
+        serializer.save(customer=self.request.user)
+
+
+class MetricsView(APIView):
+    """
+    Metrics of every worker in Prometheus text format, for staff users
+    (bearer token, or the admin session in a browser).
+    """
+    authentication_classes = [CachedJWTAuthentication, SessionAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(render(*registry.read()), content_type='text/plain; version=0.0.4; charset=utf-8')
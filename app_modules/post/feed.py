@@ -0,0 +1,118 @@
+"""
+Maintenance of the denormalized customer feed (CustomerFeedItem).
+
+Feed rows are derived from the mapping tables with set-based
+``INSERT ... SELECT`` statements, at the same points the mappings change:
+post fan-out, frame sync, event and post edits, downloads. Rows of past
+events are purged daily.
+"""
+import datetime
+
+from django.db import connection, transaction
+
+from account.models import CustomerFrame
+from .models import (
+    Category, Event, Post, OtherPost, BusinessPost, BusinessCategory, CustomerPostFrameMapping,
+    CustomerOtherPostFrameMapping, BusinessPostFrameMapping, CustomerFeedItem,
+)
+
+FEED_TABLE = CustomerFeedItem._meta.db_table
+
+FEED_COLUMNS = (
+    'customer_id, customer_frame_id, kind, mapping_id, post_id, other_post_id, business_post_id, event_id, '
+    'event_name, event_type, feed_date, category_id, category_name, file, file_type, frame_img, is_downloaded'
+)
+
+# SELECT producing FEED_COLUMNS for each mapping family. Mapping alias is `m`,
+# post alias `p`; only rows of customers and of live events are selected.
+FEED_SELECTS = {
+    'post': (
+        f"SELECT m.customer_id, m.customer_frame_id, 'post', m.id, m.post_id, NULL, NULL, p.event_id, "
+        f"e.name, e.event_type, e.event_date, NULL, NULL, p.file, p.file_type, f.frame_img, m.is_downloaded "
+        f"FROM {CustomerPostFrameMapping._meta.db_table} m "
+        f"JOIN {Post._meta.db_table} p ON p.id = m.post_id "
+        f"JOIN {Event._meta.db_table} e ON e.id = p.event_id "
+        f"JOIN {CustomerFrame._meta.db_table} f ON f.id = m.customer_frame_id "
+        f"WHERE m.customer_id IS NOT NULL AND e.event_date >= %(today)s"
+    ),
+    'other_post': (
+        f"SELECT m.customer_id, m.customer_frame_id, 'other_post', m.id, NULL, m.other_post_id, NULL, NULL, "
+        f"NULL, NULL, NULL, p.category_id, c.name, p.file, p.file_type, f.frame_img, m.is_downloaded "
+        f"FROM {CustomerOtherPostFrameMapping._meta.db_table} m "
+        f"JOIN {OtherPost._meta.db_table} p ON p.id = m.other_post_id "
+        f"JOIN {Category._meta.db_table} c ON c.id = p.category_id "
+        f"JOIN {CustomerFrame._meta.db_table} f ON f.id = m.customer_frame_id "
+        f"WHERE m.customer_id IS NOT NULL"
+    ),
+    'business_post': (
+        f"SELECT m.customer_id, m.customer_frame_id, 'business_post', m.id, NULL, NULL, m.post_id, NULL, "
+        f"NULL, NULL, NULL, p.business_category_id, bc.name, p.file, p.file_type, f.frame_img, m.is_downloaded "
+        f"FROM {BusinessPostFrameMapping._meta.db_table} m "
+        f"JOIN {BusinessPost._meta.db_table} p ON p.id = m.post_id "
+        f"LEFT JOIN {BusinessCategory._meta.db_table} bc ON bc.id = p.business_category_id "
+        f"JOIN {CustomerFrame._meta.db_table} f ON f.id = m.customer_frame_id "
+        f"WHERE m.customer_id IS NOT NULL"
+    ),
+}
+
+# Feed column holding the source post id of each family
+FEED_POST_COLUMNS = {'post': 'post_id', 'other_post': 'other_post_id', 'business_post': 'business_post_id'}
+
+
+def insert_feed_items(cursor, kind, where, params):
+    """
+    Copy the mappings of ``kind`` matching ``where`` into the feed. Rows that
+    are already there are left alone.
+    """
+    cursor.execute(
+        f"INSERT INTO {FEED_TABLE} ({FEED_COLUMNS}) {FEED_SELECTS[kind]} AND {where} "
+        f"ON CONFLICT (kind, mapping_id) DO NOTHING",
+        {'today': datetime.date.today(), **params}
+    )
+    return cursor.rowcount
+
+
+def rebuild_frame_feed(cursor, frame_id):
+    """
+    Replace every feed row of a customer frame; runs inside the frame sync.
+    """
+    cursor.execute(f"DELETE FROM {FEED_TABLE} WHERE customer_frame_id = %(frame_id)s", {'frame_id': frame_id})
+    for kind in FEED_SELECTS:
+        insert_feed_items(cursor, kind, 'm.customer_frame_id = %(frame_id)s', {'frame_id': frame_id})
+
+
+def refresh_post_feed(kind, post_id):
+    """
+    Rebuild the feed rows of one post, after its file or event changed.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FEED_TABLE} WHERE kind = %(kind)s AND {FEED_POST_COLUMNS[kind]} = %(post_id)s",
+            {'kind': kind, 'post_id': post_id}
+        )
+        return insert_feed_items(cursor, kind, 'p.id = %(post_id)s', {'post_id': post_id})
+
+
+def refresh_event_feed(event_id):
+    """
+    Rebuild the feed rows of every post of an event, after the event changed.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FEED_TABLE} WHERE event_id = %(event_id)s", {'event_id': event_id})
+        return insert_feed_items(cursor, 'post', 'p.event_id = %(event_id)s', {'event_id': event_id})
+
+
+def set_feed_downloaded(kind, mapping_id, is_downloaded):
+    CustomerFeedItem.objects.filter(kind=kind, mapping_id=mapping_id).update(is_downloaded=is_downloaded)
+
+
+def rename_feed_category(kind, category_id, name):
+    # Feed rows of other and business posts never expire, so they are renamed in place
+    CustomerFeedItem.objects.filter(kind=kind, category_id=category_id).update(category_name=name)
+
+
+def purge_expired_feed(today=None):
+    today = today or datetime.date.today()
+    # Nothing references feed rows, so this is a single DELETE
+    deleted, _ = CustomerFeedItem.objects.filter(feed_date__lt=today).delete()
+    return deleted
@@ -0,0 +1,184 @@
+"""
+Set-based mapping of posts to customer frames.
+
+Every post family (Post, OtherPost, BusinessPost) is mapped to the customer
+frames of its group through a mapping table. Instead of building model
+instances in Python, the mapping rows are written with ``INSERT ... SELECT``
+statements straight from ``CustomerFrame``. The unique constraint on
+(post, customer_frame) makes the insert idempotent through
+``ON CONFLICT DO NOTHING``, so a task can be retried safely.
+"""
+import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from account.models import CustomerFrame
+from app_modules.master.stats import DOWNLOADS, apply_changes
+from .feed import insert_feed_items, rebuild_frame_feed
+from .models import (
+    Event, Post, OtherPost, BusinessPost, CustomerPostFrameMapping, CustomerOtherPostFrameMapping,
+    BusinessPostFrameMapping,
+)
+
+# Number of frame ids covered by one INSERT ... SELECT statement. Keeps every
+# statement well below the 30s statement_timeout on large groups.
+FAN_OUT_CHUNK_SIZE = 5000
+
+
+class MappingFamily:
+    """
+    Describes how one post model is mapped to customer frames.
+
+    ``match_fields`` lists the (post column, frame column, nullable) triples
+    that must be equal for a frame to receive a post. ``live_condition`` is an
+    optional SQL filter on the post (alias ``p``) restricting which posts a
+    newly synced frame receives; mappings outside of it are never touched.
+    """
+
+    def __init__(self, name, post_model, mapping_model, post_field, match_fields, live_condition=None):
+        self.name = name
+        self.post_model = post_model
+        self.mapping_model = mapping_model
+        self.post_field = post_field
+        self.match_fields = match_fields
+        self.live_condition = live_condition or 'TRUE'
+
+    @property
+    def post_column(self):
+        return self.mapping_model._meta.get_field(self.post_field).column
+
+    def join_condition(self, post_alias='p', frame_alias='f'):
+        return ' AND '.join(
+            f'{frame_alias}.{frame_column} IS NOT DISTINCT FROM {post_alias}.{post_column}'
+            if nullable else f'{frame_alias}.{frame_column} = {post_alias}.{post_column}'
+            for post_column, frame_column, nullable in self.match_fields
+        )
+
+    def insert_sql(self, where):
+        return (
+            f'INSERT INTO {self.mapping_model._meta.db_table} '
+            f'(created, modified, customer_id, {self.post_column}, customer_frame_id, is_downloaded) '
+            f'SELECT %(now)s, %(now)s, f.customer_id, p.id, f.id, false '
+            f'FROM {CustomerFrame._meta.db_table} f '
+            f'JOIN {self.post_model._meta.db_table} p ON {self.join_condition()} '
+            f'WHERE {where} '
+            f'ON CONFLICT ({self.post_column}, customer_frame_id) DO NOTHING'
+        )
+
+
+FAMILIES = {
+    'post': MappingFamily(
+        'post', Post, CustomerPostFrameMapping, 'post',
+        match_fields=[('group_id', 'group_id', False)],
+        live_condition=f'p.event_id IN (SELECT e.id FROM {Event._meta.db_table} e WHERE e.event_date >= %(today)s)',
+    ),
+    'other_post': MappingFamily(
+        'other_post', OtherPost, CustomerOtherPostFrameMapping, 'other_post',
+        match_fields=[('group_id', 'group_id', False)],
+    ),
+    'business_post': MappingFamily(
+        'business_post', BusinessPost, BusinessPostFrameMapping, 'post',
+        match_fields=[
+            ('group_id', 'group_id', False),
+            ('business_category_id', 'business_category_id', True),
+            ('profession_type', 'profession_type', True),
+        ],
+    ),
+}
+
+
+def _frame_id_bounds(family, post_id):
+    sql = (
+        f'SELECT MIN(f.id), MAX(f.id) '
+        f'FROM {CustomerFrame._meta.db_table} f '
+        f'JOIN {family.post_model._meta.db_table} p ON {family.join_condition()} '
+        f'WHERE p.id = %(post_id)s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'post_id': post_id})
+        return cursor.fetchone()
+
+
+def fan_out_post(family_name, post_id, chunk_size=FAN_OUT_CHUNK_SIZE, on_progress=None):
+    """
+    Map the post ``post_id`` of the given family to every matching customer
+    frame. Returns the number of mapping rows created.
+
+    ``on_progress`` is called after every chunk with
+    ``(frames_scanned, frames_total, rows_created)``.
+    """
+    family = FAMILIES[family_name]
+    low, high = _frame_id_bounds(family, post_id)
+    if low is None:
+        return 0
+
+    sql = family.insert_sql('p.id = %(post_id)s AND f.id >= %(start)s AND f.id < %(stop)s')
+    feed_where = 'p.id = %(post_id)s AND m.customer_frame_id >= %(start)s AND m.customer_frame_id < %(stop)s'
+
+    total = high - low + 1
+    created = 0
+    for start in range(low, high + 1, chunk_size):
+        params = {'now': timezone.now(), 'post_id': post_id, 'start': start, 'stop': start + chunk_size}
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            created += cursor.rowcount
+            # The chunk's feed rows are committed together with its mappings
+            insert_feed_items(cursor, family_name, feed_where, params)
+
+        if on_progress:
+            on_progress(min(start + chunk_size, high + 1) - low, total, created)
+
+    return created
+
+
+def sync_frame_mappings(frame_id, reset_downloads=False):
+    """
+    Bring the mappings of one customer frame in line with its current group,
+    business category and profession type, across all post families.
+
+    Mappings to live posts the frame no longer matches are deleted, missing
+    ones are inserted, and with ``reset_downloads`` every remaining mapping is
+    marked as not downloaded. The frame's feed rows are rebuilt, and the
+    downloads statistic adjusted, in the same transaction. Returns a
+    ``{family: (deleted, reset, created)}`` summary.
+    """
+    params = {'frame_id': frame_id, 'now': timezone.now(), 'today': datetime.date.today()}
+    summary = {}
+    # Downloaded mappings removed or reset; raw SQL bypasses the stat signals
+    downloads_lost = 0
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for name, family in FAMILIES.items():
+            mapping_table = family.mapping_model._meta.db_table
+
+            cursor.execute(
+                f'DELETE FROM {mapping_table} m '
+                f'USING {family.post_model._meta.db_table} p, {CustomerFrame._meta.db_table} f '
+                f'WHERE m.customer_frame_id = %(frame_id)s AND f.id = %(frame_id)s '
+                f'AND m.{family.post_column} = p.id AND {family.live_condition} '
+                f'AND NOT COALESCE(({family.join_condition()}), false) '
+                f'RETURNING m.is_downloaded',
+                params
+            )
+            deleted_rows = cursor.fetchall()
+            deleted = len(deleted_rows)
+            downloads_lost += sum(1 for (is_downloaded,) in deleted_rows if is_downloaded)
+
+            reset = 0
+            if reset_downloads:
+                cursor.execute(
+                    f'UPDATE {mapping_table} SET is_downloaded = false, modified = %(now)s '
+                    f'WHERE customer_frame_id = %(frame_id)s AND is_downloaded',
+                    params
+                )
+                reset = cursor.rowcount
+                downloads_lost += reset
+
+            cursor.execute(family.insert_sql(f'f.id = %(frame_id)s AND {family.live_condition}'), params)
+            summary[name] = (deleted, reset, cursor.rowcount)
+
+        rebuild_frame_feed(cursor, frame_id)
+        apply_changes({(DOWNLOADS, None): -downloads_lost})
+
+    return summary
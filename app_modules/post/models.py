@@ -1,10 +1,12 @@
 from account.models import User, CustomerFrame, CustomerGroup
+from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
 from django.db.models import CharField
 
 from lib.constants import FILE_TYPE, PROFESSION_TYPE
-from lib.helpers import rename_file_name, converter_to_webp
+from lib.helpers import rename_file_name
 from lib.models import BaseModel
+from lib.search import trigram_index
 
 
 class Category(BaseModel):
@@ -13,30 +15,32 @@ class Category(BaseModel):
     banner_image = models.ImageField(upload_to='category_banners/', null=True, blank=True)
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
+    renditions = GenericRelation('master.ImageRendition')
+
+    rendition_fields = ('banner_image',)
+
+    class Meta:
+        indexes = [trigram_index('name', name='post_category_name_trgm')]
 
     def __str__(self) -> CharField:
         return self.name
 
-    def save(self, *args, **kwargs):
-        if self.banner_image:
-            converter_to_webp(self.banner_image)
-        super().save(*args, **kwargs)
-
 
 class Event(BaseModel):
     name = models.CharField(max_length=100)
     event_date = models.DateField(null=True, blank=True)
     event_type = models.CharField(max_length=50, choices=FILE_TYPE, default='image')
     thumbnail = models.FileField(upload_to=rename_file_name('event_thumbnail/'), null=True)
+    renditions = GenericRelation('master.ImageRendition')
+
+    rendition_fields = ('thumbnail',)
+
+    class Meta:
+        indexes = [trigram_index('name', name='post_event_name_trgm')]
 
     def __str__(self) -> str:
         return self.name
 
-    def save(self, *args, **kwargs):
-        if self.thumbnail:
-            converter_to_webp(self.thumbnail)
-        super().save(*args, **kwargs)
-
 
 class Post(BaseModel):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="post_event")
@@ -48,14 +52,17 @@ class Post(BaseModel):
         related_name="customer_post_group",
         null=True, blank=True
     )
+    # Probed once at upload time, so renders never have to probe the file again
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    codec = models.CharField(max_length=20, null=True, blank=True)
+    renditions = GenericRelation('master.ImageRendition')
+
+    rendition_fields = ('file',)
 
     def __str__(self) -> str:
         return f"Post {self.id}"
-    
-    def save(self, *args, **kwargs):
-        if self.file_type == 'image':
-            converter_to_webp(self.file)
-        super().save(*args, **kwargs)
 
 
 class OtherPost(BaseModel):
@@ -69,29 +76,32 @@ class OtherPost(BaseModel):
         related_name="customer_other_post_group",
         null=True, blank=True
     )
+    # Probed once at upload time, so renders never have to probe the file again
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    codec = models.CharField(max_length=20, null=True, blank=True)
+    renditions = GenericRelation('master.ImageRendition')
+
+    rendition_fields = ('file',)
 
     def __str__(self) -> str:
         return self.category.name
 
-    def save(self, *args, **kwargs):
-        if self.file_type == "image":
-            converter_to_webp(self.file)
-        super().save(*args, **kwargs)
-        
    
 class BusinessCategory(BaseModel):
     profession_type = models.CharField(max_length=20, choices=PROFESSION_TYPE)
     name = models.CharField(max_length=100, unique=True)
     thumbnail = models.FileField(upload_to=rename_file_name('business_category_thumbnail/'))
-    
+    renditions = GenericRelation('master.ImageRendition')
+
+    rendition_fields = ('thumbnail',)
+
+    class Meta:
+        indexes = [trigram_index('name', name='post_bcategory_name_trgm')]
+
     def __str__(self) -> str:
         return self.name
-    
-    
-    def save(self, *args, **kwargs):
-        if self.thumbnail:
-            converter_to_webp(self.thumbnail)
-        super().save(*args, **kwargs)   
 
      
 class BusinessPost(BaseModel):
@@ -145,6 +155,11 @@ class CustomerPostFrameMapping(BaseModel):
     class Meta:
         indexes = [
             models.Index(fields=['customer', 'post', 'customer_frame']),
+            # Serves the customer's feed, filtered by download state
+            models.Index(fields=['customer', 'is_downloaded', 'post']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'customer_frame'], name='unique_%(class)s_post_frame'),
         ]
 
 
@@ -173,6 +188,11 @@ class CustomerOtherPostFrameMapping(BaseModel):
     class Meta:
         indexes = [
             models.Index(fields=['customer', 'other_post', 'customer_frame']),
+            # Serves the customer's feed, filtered by download state
+            models.Index(fields=['customer', 'is_downloaded', 'other_post']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['other_post', 'customer_frame'], name='unique_%(class)s_post_frame'),
         ]
 
 
@@ -205,4 +225,51 @@ class BusinessPostFrameMapping(BaseModel):
     class Meta:
         indexes = [
             models.Index(fields=['customer', 'post', 'customer_frame']),
-        ]
\ No newline at end of file
+            # Serves the customer's feed, filtered by download state
+            models.Index(fields=['customer', 'is_downloaded', 'post']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'customer_frame'], name='unique_%(class)s_post_frame'),
+        ]
+
+
+class CustomerFeedItem(models.Model):
+    """
+    Denormalized copy of one customer mapping with everything the mobile feed
+    shows, maintained by app_modules.post.feed. A customer's whole feed is read
+    with one range scan on (customer, kind, feed_date).
+    """
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="feed_items", db_index=False)
+    customer_frame = models.ForeignKey(CustomerFrame, on_delete=models.CASCADE, related_name="feed_items")
+    kind = models.CharField(max_length=20)
+    # Id of the row in the mapping table of `kind`
+    mapping_id = models.BigIntegerField()
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name="feed_items")
+    other_post = models.ForeignKey(
+        OtherPost, on_delete=models.CASCADE, null=True, blank=True, related_name="feed_items"
+    )
+    business_post = models.ForeignKey(
+        BusinessPost, on_delete=models.CASCADE, null=True, blank=True, related_name="feed_items"
+    )
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, null=True, blank=True, related_name="feed_items")
+    event_name = models.CharField(max_length=100, null=True, blank=True)
+    event_type = models.CharField(max_length=50, null=True, blank=True)
+    # Event date of event posts, used to expire the row; NULL for posts without an event
+    feed_date = models.DateField(null=True, blank=True)
+    category_id = models.BigIntegerField(null=True, blank=True)
+    category_name = models.CharField(max_length=100, null=True, blank=True)
+    file = models.CharField(max_length=100)
+    file_type = models.CharField(max_length=50)
+    frame_img = models.CharField(max_length=100, null=True, blank=True)
+    is_downloaded = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'kind', 'feed_date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'mapping_id'], name='unique_feed_item_mapping'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Feed item {self.kind} {self.mapping_id}"
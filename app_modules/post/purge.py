@@ -0,0 +1,159 @@
+"""
+Batched purge of past events.
+
+Expired feed rows, post mappings, posts and events are deleted table by table
+in id-range batches. Every batch is its own short transaction, so no lock is
+held for long and no statement comes near the statement_timeout. Files of the
+deleted rows are removed once their batch has committed; files left behind by
+earlier purges or failed uploads are collected by ``collect_orphan_files``.
+"""
+import datetime
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+
+from app_modules.master import stats
+from app_modules.master.models import ImageRendition
+from lib.batches import DELETE_BATCH_SIZE, delete_in_batches
+from lib.video import SCALED_FRAME_DIRECTORY
+from .models import Event, Post, CustomerPostFrameMapping, CustomerFeedItem
+from .render import RENDER_DIRECTORY
+
+PURGE_BATCH_SIZE = DELETE_BATCH_SIZE
+
+# Files younger than this are never collected, so uploads whose row is not
+# committed yet are left alone.
+ORPHAN_GRACE_PERIOD = datetime.timedelta(days=1)
+
+
+def _delete_files(field, names):
+    storage = field.storage
+    for name in names:
+        if name:
+            storage.delete(name)
+
+
+def _delete_renditions(model, object_ids):
+    renditions = ImageRendition.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), object_id__in=object_ids
+    )
+    _delete_files(ImageRendition._meta.get_field('file'), renditions.values_list('file', flat=True))
+    renditions.delete()
+
+
+def purge_past_events(today=None, batch_size=PURGE_BATCH_SIZE, delete_files=True, on_batch=None):
+    """
+    Delete every event dated before ``today`` with its posts, mappings, feed
+    rows, renditions and files.
+
+    ``on_batch`` is called after every batch with ``(label, rows)``. Returns a
+    ``{label: (rows, seconds)}`` summary. The DELETEs bypass the statistics
+    signals, so the rollups are recounted afterwards.
+    """
+    params = {'today': today or datetime.date.today()}
+    event_table = Event._meta.db_table
+    post_table = Post._meta.db_table
+
+    steps = [
+        ('feed items', CustomerFeedItem._meta.db_table, 't.feed_date < %(today)s', (), None),
+        (
+            'post mappings', CustomerPostFrameMapping._meta.db_table,
+            't.post_id = p.id AND p.event_id = e.id AND e.event_date < %(today)s',
+            (f'{post_table} p', f'{event_table} e'), None,
+        ),
+        (
+            'posts', post_table, 't.event_id = e.id AND e.event_date < %(today)s',
+            (f'{event_table} e',), (Post, 'file'),
+        ),
+        ('events', event_table, 't.event_date < %(today)s', (), (Event, 'thumbnail')),
+    ]
+
+    summary = {}
+    for label, table, where, using, media in steps:
+        started = time.monotonic()
+        deleted = 0
+        returning = f't.id, t.{media[1]}' if media else 't.id'
+        for rows in delete_in_batches(table, where, params, batch_size, using=using, returning=returning):
+            deleted += len(rows)
+            if media and delete_files:
+                model, field_name = media
+                _delete_renditions(model, [row[0] for row in rows])
+                _delete_files(model._meta.get_field(field_name), [row[1] for row in rows])
+            if on_batch:
+                on_batch(label, len(rows))
+        summary[label] = (deleted, time.monotonic() - started)
+
+    if any(rows for rows, _ in summary.values()):
+        stats.reconcile()
+    return summary
+
+
+def _is_stale(path, now, max_age):
+    try:
+        return now - os.stat(path).st_mtime > max_age.total_seconds()
+    except FileNotFoundError:
+        return False
+
+
+def collect_orphan_files(grace_period=ORPHAN_GRACE_PERIOD, render_max_age=None):
+    """
+    Remove media files nothing points at anymore:
+
+    * ``post/`` and ``event_thumbnail/`` files no row references;
+    * renders under ``video-with-frame/`` unused for ``render_max_age``. A
+      render key includes the post file name, so renders of deleted posts are
+      never served again and age out here;
+    * job directories left behind by crashed renders;
+    * resized frames under ``frame-scaled/`` unused for ``render_max_age``,
+      and temporary files of resizes that crashed.
+
+    Returns a ``{directory: files_removed}`` summary.
+    """
+    render_max_age = render_max_age or datetime.timedelta(seconds=settings.RENDER_ORPHAN_MAX_AGE)
+    now = time.time()
+    summary = {}
+
+    referenced_by = {
+        'post': Post.objects.values_list('file', flat=True),
+        'event_thumbnail': Event.objects.exclude(thumbnail='').values_list('thumbnail', flat=True),
+    }
+    for directory, names in referenced_by.items():
+        referenced = set(names.iterator())
+        path = os.path.join(settings.MEDIA_ROOT, directory)
+        removed = 0
+        if os.path.isdir(path):
+            for entry in os.scandir(path):
+                name = f'{directory}/{entry.name}'
+                if entry.is_file() and name not in referenced and _is_stale(entry.path, now, grace_period):
+                    os.remove(entry.path)
+                    removed += 1
+        summary[directory] = removed
+
+    render_directory = os.path.join(settings.MEDIA_ROOT, RENDER_DIRECTORY)
+    removed = 0
+    if os.path.isdir(render_directory):
+        for entry in os.scandir(render_directory):
+            if entry.is_file() and _is_stale(entry.path, now, render_max_age):
+                os.remove(entry.path)
+                removed += 1
+        jobs_directory = os.path.join(render_directory, '.jobs')
+        if os.path.isdir(jobs_directory):
+            for entry in os.scandir(jobs_directory):
+                if entry.is_dir() and _is_stale(entry.path, now, grace_period):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+    summary[RENDER_DIRECTORY] = removed
+
+    scaled_directory = os.path.join(settings.MEDIA_ROOT, SCALED_FRAME_DIRECTORY)
+    removed = 0
+    if os.path.isdir(scaled_directory):
+        for entry in os.scandir(scaled_directory):
+            max_age = grace_period if entry.name.endswith('.tmp') else render_max_age
+            if entry.is_file() and _is_stale(entry.path, now, max_age):
+                os.remove(entry.path)
+                removed += 1
+    summary[SCALED_FRAME_DIRECTORY] = removed
+
+    return summary
@@ -0,0 +1,165 @@
+"""
+Content-addressed cache for videos rendered with a customer frame.
+
+A render is identified by a hash of the post file, the frame image and the
+overlay parameters. Each render is stored once under ``video-with-frame/``
+and reused by every request for the same key. A cache lock makes sure
+concurrent requests for the same key run only one render.
+"""
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from lib.video import composite_video, job_directory
+
+RENDER_DIRECTORY = 'video-with-frame'
+
+# Bump when the overlay pipeline changes so stale renders are not reused.
+RENDER_VERSION = 2
+
+
+def overlay_params():
+    return {'version': RENDER_VERSION, 'preset': settings.VIDEO_RENDER_PRESET}
+
+
+def _file_fingerprint(field_file):
+    # Uploaded files get a random name, so name and size identify the content.
+    return {'name': field_file.name, 'size': field_file.size}
+
+
+def render_key(frame_image, video_file, params=None):
+    payload = json.dumps({
+        'frame': _file_fingerprint(frame_image),
+        'video': _file_fingerprint(video_file),
+        'overlay': params or overlay_params(),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_path(key):
+    return os.path.join(settings.MEDIA_ROOT, RENDER_DIRECTORY, f"{key}.mp4")
+
+
+def render_url(key):
+    return os.path.join(settings.MEDIA_URL, RENDER_DIRECTORY, f"{key}.mp4")
+
+
+def _lock_key(key):
+    return f"render_lock_{key}"
+
+
+def get_cached_render(key):
+    """
+    Return the URL of a finished render, marking it as recently used, or None.
+    """
+    path = render_path(key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return render_url(key)
+
+
+def is_render_pending(key):
+    return cache.get(_lock_key(key)) is not None
+
+
+def _job_key(user_id, key):
+    return f"render_job_{user_id}_{key}"
+
+
+def grant_render_status(user_id, key):
+    """
+    Let ``user_id`` poll the render ``key``. Keys are derived from file names
+    and sizes, so they are not secret and status lookups are scoped per user.
+    """
+    cache.set(_job_key(user_id, key), True, settings.RENDER_JOB_TIMEOUT)
+
+
+def can_view_render_status(user_id, key):
+    return cache.get(_job_key(user_id, key)) is not None
+
+
+def render_priority(post):
+    # Other posts have no event
+    event = getattr(post, 'event', None)
+    if event is not None and event.event_date == timezone.localdate():
+        return settings.RENDER_PRIORITY_TODAY
+    return settings.RENDER_PRIORITY
+
+
+def request_render(customer_frame, post):
+    """
+    Return ``(key, url)`` for the render of ``post`` with ``customer_frame``.
+    ``url`` is None while the render is still running; the render is enqueued
+    unless another request already did so.
+    """
+    from app_modules.post.tasks import render_video_with_frame
+
+    key = render_key(customer_frame.frame_img, post.file)
+    url = get_cached_render(key)
+    if url:
+        return key, url
+
+    if cache.add(_lock_key(key), True, settings.RENDER_LOCK_TIMEOUT):
+        render_video_with_frame.apply_async(
+            (key, customer_frame.frame_img.path, post.file.path),
+            {
+                'frame_meta': {'width': customer_frame.width, 'height': customer_frame.height},
+                'video_meta': {'width': post.width, 'height': post.height},
+            },
+            priority=render_priority(post),
+        )
+    return key, None
+
+
+def run_render(key, frame_image_path, video_path, frame_meta=None, video_meta=None):
+    """
+    Render inside a job directory next to the cache and move the result into
+    place, so a partially written video is never served.
+    """
+    output_path = render_path(key)
+    jobs_directory = os.path.join(os.path.dirname(output_path), '.jobs')
+    os.makedirs(jobs_directory, exist_ok=True)
+    try:
+        with job_directory(parent=jobs_directory) as directory:
+            temp_path = os.path.join(directory, 'output.mp4')
+            composite_video(video_path, frame_image_path, temp_path, video_meta=video_meta, frame_meta=frame_meta)
+            os.replace(temp_path, output_path)
+    finally:
+        cache.delete(_lock_key(key))
+    return render_url(key)
+
+
+def evict_renders(max_bytes=None):
+    """
+    Delete the least recently used renders until the cache fits in
+    ``max_bytes``. Returns the number of files removed.
+    """
+    max_bytes = settings.RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    directory = os.path.join(settings.MEDIA_ROOT, RENDER_DIRECTORY)
+    if not os.path.isdir(directory):
+        return 0
+
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
@@ -1,19 +1,58 @@
+from collections import defaultdict
+
 from rest_framework import serializers
+from django.db import models
 from django.utils import timezone
 
 from account.models import CustomerFrame
+from lib.loaders import RequestLoader
+from lib.serializers import SrcsetField
 from .models import (
     Category, Post, Event, OtherPost, CustomerPostFrameMapping, CustomerOtherPostFrameMapping,
     BusinessPost, BusinessPostFrameMapping, BusinessCategory
 )
 
 
+def customer_frame_loader(request):
+    """
+    Frame image URLs of the requesting customer, keyed by group id.
+    """
+    def load(group_ids):
+        storage = CustomerFrame._meta.get_field('frame_img').storage
+        frames = CustomerFrame.objects.filter(
+            customer=request.user, group_id__in=group_ids
+        ).exclude(frame_img='').exclude(frame_img__isnull=True).values_list('group_id', 'frame_img')
+
+        urls = defaultdict(list)
+        for group_id, frame_img in frames:
+            urls[group_id].append(request.build_absolute_uri(storage.url(frame_img)))
+        return urls
+
+    return RequestLoader.for_request(request, 'customer_frames_by_group', load, default=[])
+
+
+class CustomerDetailsListSerializer(serializers.ListSerializer):
+    """
+    Primes the customer frame loader with the groups of the whole page, so
+    ``customer_details`` costs one query per page.
+    """
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.Manager) else data
+        items = list(items)
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            customer_frame_loader(request).prime({item.group_id for item in items if item.group_id})
+        return super().to_representation(items)
+
+
 class SubcategorySerializer(serializers.ModelSerializer):
     banner_image = serializers.SerializerMethodField()
+    banner_image_srcset = SrcsetField('banner_image')
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'banner_image']
+        fields = ['id', 'name', 'banner_image', 'banner_image_srcset']
 
     def get_banner_image(self, obj):
         request = self.context.get('request')
@@ -24,24 +63,31 @@ class SubcategorySerializer(serializers.ModelSerializer):
 
 class CategorySerializer(serializers.ModelSerializer):
     sub_categories = serializers.SerializerMethodField()
+    banner_image_srcset = SrcsetField('banner_image')
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'sub_category', 'sub_categories', 'banner_image', 'is_active', 'is_featured']
+        fields = ['id', 'name', 'sub_category', 'sub_categories', 'banner_image', 'banner_image_srcset', 'is_active',
+                  'is_featured']
 
     def get_sub_categories(self, obj):
         if not self.context.get('exclude_main_categories'):
-            sub_categories = Category.objects.filter(sub_category=obj)
+            # Views prefetch subcategories into `prefetched_sub_categories`; fall back to a query otherwise
+            sub_categories = getattr(obj, 'prefetched_sub_categories', None)
+            if sub_categories is None:
+                sub_categories = Category.objects.filter(sub_category=obj).prefetch_related('renditions')
             serializer = SubcategorySerializer(sub_categories, many=True, context=self.context)
             return serializer.data
         return []
     
 
 class BusinessCategorySerializer(serializers.ModelSerializer):
+    thumbnail_srcset = SrcsetField('thumbnail')
+
     class Meta:
         model = BusinessCategory
         fields = [
-            'id', 'profession_type', 'name', 'thumbnail'
+            'id', 'profession_type', 'name', 'thumbnail', 'thumbnail_srcset'
         ]
         
     
@@ -59,9 +105,11 @@ class SubCategorySerializer(serializers.ModelSerializer):
 
    
 class EventSerializer(serializers.ModelSerializer):
+    thumbnail_srcset = SrcsetField('thumbnail')
+
     class Meta:
         model = Event
-        fields = ['id', 'name', 'event_date', 'event_type', 'thumbnail']
+        fields = ['id', 'name', 'event_date', 'event_type', 'thumbnail', 'thumbnail_srcset']
         
     def validate_event_date(self, value):
         if value and value < timezone.now().date():
@@ -73,17 +121,19 @@ class PostSerializer(serializers.ModelSerializer):
     group_name = serializers.SerializerMethodField()
     event_details = serializers.SerializerMethodField()
     customer_details = serializers.SerializerMethodField()
+    file_srcset = SrcsetField('file')
 
     class Meta:
         model = Post
-        fields = ['id', 'event', 'file_type', 'file', 'group', 'added_on',
+        fields = ['id', 'event', 'file_type', 'file', 'file_srcset', 'group', 'added_on',
                   'group_name', 'customer_details', 'event_details']
+        list_serializer_class = CustomerDetailsListSerializer
 
     def get_customer_details(self, obj):
         request = self.context.get('request')
-        frames = CustomerFrame.objects.select_related('customer', 'group').filter(customer=request.user, group__name=obj.group.name)
-        urls = [request.build_absolute_uri(frame.frame_img.url) for frame in frames]
-        return urls
+        if not obj.group_id or not request.user.is_authenticated:
+            return []
+        return customer_frame_loader(request).load(obj.group_id)
         
 
     def get_group_name(self, obj):
@@ -108,10 +158,11 @@ class PostSerializer(serializers.ModelSerializer):
 class OtherPostSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source="category.name", read_only=True)
     group_name = serializers.CharField(source="group.name", read_only=True)
+    file_srcset = SrcsetField('file')
     
     class Meta:
         model  = OtherPost
-        fields = ['id', 'category', 'category_name', 'file_type', 'file', 'group', 'group_name']
+        fields = ['id', 'category', 'category_name', 'file_type', 'file', 'file_srcset', 'group', 'group_name']
     
     
 class BusinessPostSerializer(serializers.ModelSerializer):
@@ -126,12 +177,13 @@ class BusinessPostSerializer(serializers.ModelSerializer):
             'id', 'business_category', 'profession_type', 'file_type', 'file', 'group', 'added_on',
             'group_name', 'customer_details', 'business_category_name', 'thumbnail'
         ]
+        list_serializer_class = CustomerDetailsListSerializer
 
     def get_customer_details(self, obj):
         request = self.context.get('request')
-        frames = CustomerFrame.objects.select_related('customer', 'group').filter(customer=request.user, group__name=obj.group.name)
-        urls = [request.build_absolute_uri(frame.frame_img.url) for frame in frames]
-        return urls
+        if not obj.group_id or not request.user.is_authenticated:
+            return []
+        return customer_frame_loader(request).load(obj.group_id)
         
 
 class CustomerPostFrameMappingSerializer(serializers.ModelSerializer):
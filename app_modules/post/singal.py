@@ -1,15 +1,108 @@
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from app_modules.post.tasks import *
+from app_modules.post.tasks import EVENT_FEEDS, POST_FEEDS, IMPORTED_POSTS
+from app_modules.master.tasks import store_media_metadata
+from lib.dispatch import register_reconciler, suspendable
+
+from .feed import rename_feed_category, set_feed_downloaded
 
 from .models import *
 
+FEED_KINDS = {
+    Post: 'post', OtherPost: 'other_post', BusinessPost: 'business_post',
+    CustomerPostFrameMapping: 'post', CustomerOtherPostFrameMapping: 'other_post',
+    BusinessPostFrameMapping: 'business_post',
+}
+
+MEDIA_METADATA_FIELDS = ('width', 'height', 'duration', 'codec')
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=OtherPost)
+def store_post_media_metadata(sender, instance, created, update_fields=None, **kwargs):
+    if instance.file and (created or update_fields is None or 'file' in update_fields):
+        # ffprobe runs on a worker, not in the admin request saving the post
+        transaction.on_commit(lambda: store_media_metadata.delay(
+            sender._meta.app_label, sender._meta.model_name, instance.pk, 'file', MEDIA_METADATA_FIELDS
+        ))
+
+
+# Event fields copied into the customer feed
+EVENT_FEED_FIELDS = {'name', 'event_date', 'event_type'}
+
+
+@receiver(post_save, sender=Event)
+@suspendable
+def trigger_event_feed_refresh(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or EVENT_FEED_FIELDS.intersection(update_fields)):
+        EVENT_FEEDS.trigger(instance.id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=OtherPost)
+@receiver(post_save, sender=BusinessPost)
+@suspendable
+def trigger_post_feed_refresh(sender, instance, created, update_fields=None, **kwargs):
+    # New posts reach the feed through their fan-out task
+    if not created and (update_fields is None or {'file', 'file_type', 'event'}.intersection(update_fields)):
+        POST_FEEDS.trigger(f"{FEED_KINDS[sender]}:{instance.id}")
+
+
+# Feed kind whose rows copy the category's name
+CATEGORY_FEED_KINDS = {Category: 'other_post', BusinessCategory: 'business_post'}
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=BusinessCategory)
+def trigger_feed_category_rename(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'name' in update_fields):
+        kind, name = CATEGORY_FEED_KINDS[sender], instance.name
+        transaction.on_commit(lambda: rename_feed_category(kind, instance.id, name))
+
+
+@receiver(post_save, sender=CustomerPostFrameMapping)
+@receiver(post_save, sender=CustomerOtherPostFrameMapping)
+@receiver(post_save, sender=BusinessPostFrameMapping)
+@suspendable
+def sync_feed_download_state(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'is_downloaded' in update_fields):
+        set_feed_downloaded(FEED_KINDS[sender], instance.id, instance.is_downloaded)
+
+
+def refresh_imported_events(touched):
+    EVENT_FEEDS.trigger(*touched[Event])
+
+
+def reconcile_imported_posts(touched):
+    IMPORTED_POSTS.trigger(*(
+        f"{FEED_KINDS[model]}:{post_id}" for model, post_ids in touched.items() for post_id in post_ids
+    ))
+
+
+def sync_imported_download_states(touched):
+    # Two UPDATEs per mapping kind instead of one per saved mapping
+    for model, mapping_ids in touched.items():
+        for is_downloaded in (True, False):
+            CustomerFeedItem.objects.filter(
+                kind=FEED_KINDS[model],
+                mapping_id__in=model.objects.filter(pk__in=mapping_ids, is_downloaded=is_downloaded).values('pk'),
+            ).update(is_downloaded=is_downloaded)
+
+
+register_reconciler(refresh_imported_events, Event)
+register_reconciler(reconcile_imported_posts, Post, OtherPost, BusinessPost)
+register_reconciler(
+    sync_imported_download_states, CustomerPostFrameMapping, CustomerOtherPostFrameMapping, BusinessPostFrameMapping
+)
+
+
 @receiver(post_save, sender=Post)
+@suspendable
 def trigger_post_mapping(sender, instance, created, **kwargs):
     if created:
-        # map_post_with_customer_frames.delay(instance.id)
-        map_post_with_customer_frames(instance.id)
+        transaction.on_commit(lambda: map_post_with_customer_frames.delay(instance.id))
 
 
 # @receiver(post_save, sender=Post)
@@ -32,10 +125,10 @@ def trigger_post_mapping(sender, instance, created, **kwargs):
 #         CustomerPostFrameMapping.objects.bulk_create(customer_frame_mappings)
 
 @receiver(post_save, sender=OtherPost)
+@suspendable
 def trigger_other_post_mapping(sender, instance, created, **kwargs):
     if created:
-        # map_other_post_with_customer_frames.delay(instance.id)
-        map_other_post_with_customer_frames(instance.id)
+        transaction.on_commit(lambda: map_other_post_with_customer_frames.delay(instance.id))
         
 
 # @receiver(post_save, sender=OtherPost)
@@ -59,10 +152,10 @@ def trigger_other_post_mapping(sender, instance, created, **kwargs):
 #             CustomerOtherPostFrameMapping.objects.bulk_create(mappings_to_create)
 
 @receiver(post_save, sender=BusinessPost)
+@suspendable
 def trigger_business_post_mapping(sender, instance, created, **kwargs):
     if created:
-        # map_business_post_with_customer_frames.delay(instance.id)
-        map_business_post_with_customer_frames(instance.id)
+        transaction.on_commit(lambda: map_business_post_with_customer_frames.delay(instance.id))
         
 
 # @receiver(post_save, sender=BusinessPost)
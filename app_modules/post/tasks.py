@@ -1,101 +1,112 @@
 from celery import shared_task
-from .models import *
+
+from lib.dispatch import Coalescer
+from .feed import refresh_event_feed, refresh_post_feed, purge_expired_feed
+from .mapping import fan_out_post
+from .purge import purge_past_events as purge_events, collect_orphan_files
+from .render import run_render, evict_renders
+# Autodiscovery only imports tasks.py; registers process_video, so workers run it and the task metrics cover it
+from .task import process_video  # noqa: F401
+
+
+def _progress_reporter(task):
+    def report(done, total, created):
+        task.update_state(state='PROGRESS', meta={'done': done, 'total': total, 'created': created})
+    return report
+
+
+@shared_task(bind=True, ignore_result=False)
+def map_post_with_customer_frames(self, post_id):
+    created = fan_out_post('post', post_id, on_progress=_progress_reporter(self))
+    return f"Created {created} mappings for Post with id {post_id}."
+
+
+@shared_task(bind=True, ignore_result=False)
+def map_other_post_with_customer_frames(self, other_post_id):
+    created = fan_out_post('other_post', other_post_id, on_progress=_progress_reporter(self))
+    return f"Created {created} mappings for OtherPost with id {other_post_id}."
+
+
+@shared_task(bind=True, ignore_result=False)
+def map_business_post_with_customer_frames(self, business_post_id):
+    created = fan_out_post('business_post', business_post_id, on_progress=_progress_reporter(self))
+    return f"Created {created} mappings for BusinessPost with id {business_post_id}."
+
 
 @shared_task
-def map_post_with_customer_frames(post_id):
-    try:
-        instance = Post.objects.select_related('event', 'group').get(id=post_id)
-    except Post.DoesNotExist:
-        return f"Post with id {post_id} does not exist."
-
-    customer_frames = instance.group.customer_frame_group.all().values_list('customer_id', 'id')
-
-    customer_frame_mappings = [
-        CustomerPostFrameMapping(
-            customer_id=customer_id,
-            post=instance,
-            customer_frame_id=frame_id,
-        )
-        for customer_id, frame_id in customer_frames
-    ]
-
-    CustomerPostFrameMapping.objects.bulk_create(
-        customer_frame_mappings, 
-        batch_size=200
-    )
+def render_video_with_frame(render_key, frame_image_path, video_path, frame_meta=None, video_meta=None):
+    return run_render(render_key, frame_image_path, video_path, frame_meta=frame_meta, video_meta=video_meta)
+
 
 @shared_task
-def map_other_post_with_customer_frames(other_post_id):
-    try:
-        instance = OtherPost.objects.get(id=other_post_id)
-    except OtherPost.DoesNotExist:
-        return f"OtherPost with id {other_post_id} does not exist."
-
-    customer_group = instance.group
-
-    customer_ids = list(customer_group.customer_frame_group.values_list(
-        'customer_id', 
-        flat=True
-    ).distinct())
-
-    all_mappings = []
-    for customer_id in customer_ids:
-        customer_frames = customer_group.customer_frame_group.filter(
-            customer_id=customer_id
-        ).values_list('id', flat=True)
-
-        all_mappings.extend([
-            CustomerOtherPostFrameMapping(
-                customer_id=customer_id,
-                other_post=instance,
-                customer_frame_id=frame_id,
-            )
-            for frame_id in customer_frames
-        ])
-
-    CustomerOtherPostFrameMapping.objects.bulk_create(
-        all_mappings, 
-        batch_size=350
-    )
+def evict_rendered_videos():
+    removed = evict_renders()
+    return f"Evicted {removed} rendered videos."
+
 
 @shared_task
-def map_business_post_with_customer_frames(business_post_id):
-    try:
-        instance = BusinessPost.objects.get(id=business_post_id)
-    except BusinessPost.DoesNotExist:
-        return f"BusinessPost with id {business_post_id} does not exist."
-
-    customer_group = instance.group
-
-    customer_ids = list(customer_group.customer_frame_group.values_list(
-        'customer_id', 
-        flat=True
-    ).distinct())
-
-    existing_mappings = set(
-        BusinessPostFrameMapping.objects.filter(
-            post=instance,
-            customer_id__in=customer_ids
-        ).values_list('customer_id', 'customer_frame_id')
-    )
+def refresh_event_feed_items(event_id):
+    created = refresh_event_feed(event_id)
+    return f"Rebuilt {created} feed items for Event with id {event_id}."
 
-    mappings_to_create = []
-    for customer_id in customer_ids:
-        customer_frame_ids = customer_group.customer_frame_group.filter(
-            customer_id=customer_id
-        ).values_list('id', flat=True)
-
-        mappings_to_create.extend([
-            BusinessPostFrameMapping(
-                customer_id=customer_id,
-                post=instance,
-                customer_frame_id=frame_id
-            )
-            for frame_id in customer_frame_ids
-            if (customer_id, frame_id) not in existing_mappings
-        ])
-
-    BusinessPostFrameMapping.objects.bulk_create(
-        mappings_to_create, 
-        batch_size=350
+
+@shared_task
+def refresh_post_feed_items(kind, post_id):
+    created = refresh_post_feed(kind, post_id)
+    return f"Rebuilt {created} feed items for {kind} with id {post_id}."
+
+
+def refresh_event_feeds(event_ids):
+    created = sum(refresh_event_feed(int(event_id)) for event_id in event_ids)
+    return f"Rebuilt {created} feed items for {len(event_ids)} events."
+
+
+def _posts(targets):
+    # Post targets are "kind:id", e.g. "other_post:12"
+    for target in targets:
+        kind, _, post_id = target.partition(':')
+        yield kind, int(post_id)
+
+
+def refresh_post_feeds(targets):
+    created = sum(refresh_post_feed(kind, post_id) for kind, post_id in _posts(targets))
+    return f"Rebuilt {created} feed items for {len(targets)} posts."
+
+
+def reconcile_posts(targets):
+    # Imported posts may be new or edited: map them to any frame still
+    # missing them, then rebuild their feed rows
+    created = 0
+    for kind, post_id in _posts(targets):
+        created += fan_out_post(kind, post_id)
+        refresh_post_feed(kind, post_id)
+    return f"Created {created} mappings for {len(targets)} imported posts."
+
+
+# Edits within a few seconds of each other rebuild their feed rows in one task
+EVENT_FEEDS = Coalescer('event_feed_refresh', refresh_event_feeds, window=5, queue='mapping')
+POST_FEEDS = Coalescer('post_feed_refresh', refresh_post_feeds, window=5, queue='mapping')
+# Posts saved inside bulk_import; single new posts use the map_* tasks, which report progress
+IMPORTED_POSTS = Coalescer('imported_posts', reconcile_posts, window=5, queue='mapping')
+
+
+@shared_task
+def purge_expired_feed_items():
+    deleted = purge_expired_feed()
+    return f"Purged {deleted} expired feed items."
+
+
+# Stores its result: DeletePastEventsView hands out the task id
+@shared_task(ignore_result=False)
+def purge_past_events():
+    summary = purge_events()
+    return ", ".join(
+        f"{label}: {rows} rows in {seconds:.1f}s ({rows / seconds if seconds else 0:.0f} rows/sec)"
+        for label, (rows, seconds) in summary.items()
     )
+
+
+@shared_task
+def collect_orphan_media():
+    summary = collect_orphan_files()
+    return ", ".join(f"{directory}: {removed} files" for directory, removed in summary.items())
@@ -1,3 +1,308 @@
-from django.test import TestCase
+import base64
+import json
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from account.models import User, CustomerFrame, CustomerGroup
+from app_modules.master import stats
+from .mapping import fan_out_post, sync_frame_mappings
+from .models import (
+    Category, Event, Post, OtherPost, BusinessCategory, BusinessPost, CustomerPostFrameMapping,
+    BusinessPostFrameMapping, CustomerFeedItem,
+)
+from .purge import purge_past_events
+from .render import grant_render_status
+
+
+class QueryCountTestCase(APITestCase):
+    """
+    Asserts that an endpoint costs the same number of queries however many
+    rows it returns.
+    """
+
+    def setUp(self):
+        # The first lookup of a content type is a one-off query; keep it out of the counts
+        ContentType.objects.get_for_models(*apps.get_models())
+        self.user = User.objects.create_user(email='customer@example.com', password='password', user_type='customer')
+        self.group = CustomerGroup.objects.create(name='A')
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, add_rows):
+        queries = self.count_queries(url)
+        add_rows()
+        self.assertEqual(self.count_queries(url), queries)
+
+
+class PostListQueryCountTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(name='Event', event_date=date.today())
+        CustomerFrame.objects.create(customer=self.user, group=self.group, frame_img='customer_frame/frame.png')
+        self.create_posts(2)
+
+    def create_posts(self, count):
+        for _ in range(count):
+            Post.objects.create(event=self.event, group=self.group, file='post/post.png')
+
+    def test_customer_details_is_batched_per_page(self):
+        self.assertConstantQueries('/api/post/post', lambda: self.create_posts(5))
+
+
+class KeysetPaginationTests(QueryCountTestCase):
+    url = '/api/post/post'
+
+    def setUp(self):
+        super().setUp()
+        event = Event.objects.create(name='Event', event_date=date.today())
+        self.ids = [Post.objects.create(event=event, group=self.group, file='post/post.png').id for _ in range(5)]
+        self.ids.reverse()
+
+    def page_ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']]
+
+    def test_next_and_previous_round_trip(self):
+        first = self.client.get(self.url, {'cursor': '', 'limit': 2})
+        self.assertEqual(self.page_ids(first), self.ids[:2])
+        self.assertIsNone(first.data['previous'])
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.page_ids(second), self.ids[2:4])
+        last = self.client.get(second.data['next'])
+        self.assertEqual(self.page_ids(last), self.ids[4:])
+        self.assertIsNone(last.data['next'])
+
+        self.assertEqual(self.page_ids(self.client.get(second.data['previous'])), self.ids[:2])
+        self.assertEqual(self.page_ids(self.client.get(last.data['previous'])), self.ids[2:4])
+
+    def test_tampered_cursors_are_not_found(self):
+        for payload in ({'v': [1]}, {'v': ['x'], 'r': False}, {'v': [1], 'r': 'yes'}, {'v': [None], 'r': False}, [1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, payload)
+
+
+class BusinessPostListQueryCountTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = BusinessCategory.objects.create(
+            profession_type='business', name='Shop', thumbnail='business_category_thumbnail/shop.png'
+        )
+        CustomerFrame.objects.create(
+            customer=self.user, group=self.group, business_category=self.category,
+            profession_type='business', frame_img='customer_frame/frame.png'
+        )
+        self.create_posts(2)
+
+    def create_posts(self, count):
+        for _ in range(count):
+            BusinessPost.objects.create(
+                business_category=self.category, profession_type='business', group=self.group,
+                file='business_post/post.png'
+            )
+
+    def test_customer_details_is_batched_per_page(self):
+        self.assertConstantQueries('/api/post/business-post', lambda: self.create_posts(5))
+
+
+class CategoryListQueryCountTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.created = 0
+        self.create_categories(2)
+
+    def create_categories(self, count):
+        for _ in range(count):
+            self.created += 1
+            parent = Category.objects.create(name=f'Category {self.created}')
+            Category.objects.create(name=f'Subcategory {self.created}', sub_category=parent)
+
+    def test_category_list_prefetches_sub_categories(self):
+        self.assertConstantQueries('/api/post/category-list', lambda: self.create_categories(5))
+
+    def test_category_viewset_prefetches_sub_categories(self):
+        self.assertConstantQueries('/api/post/category', lambda: self.create_categories(5))
+
+
+class CustomerFeedTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(name='Event', event_date=date.today())
+        CustomerFrame.objects.create(customer=self.user, group=self.group, frame_img='customer_frame/frame.png')
+        self.create_posts(2)
+
+    def create_posts(self, count):
+        for _ in range(count):
+            post = Post.objects.create(event=self.event, group=self.group, file='post/post.png')
+            fan_out_post('post', post.id)
+
+    def test_fan_out_fills_the_feed(self):
+        response = self.client.get('/api/post/customer-feed')
+        self.assertEqual(len(response.data['today']), 2)
+
+    def test_feed_is_one_query(self):
+        self.assertEqual(self.count_queries('/api/post/customer-feed'), 1)
+        self.assertConstantQueries('/api/post/customer-feed', lambda: self.create_posts(5))
+
+    def test_category_rename_reaches_the_feed(self):
+        category = Category.objects.create(name='Quotes')
+        post = OtherPost.objects.create(category=category, group=self.group, file='other_post/post.png')
+        fan_out_post('other_post', post.id)
+
+        category.name = 'Wishes'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        response = self.client.get('/api/post/customer-feed')
+        self.assertEqual([item['category_name'] for item in response.data['other_posts']], ['Wishes'])
+
+
+class FrameMappingSyncTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='customer@example.com', password='password', user_type='customer')
+        self.group_a = CustomerGroup.objects.create(name='A')
+        self.group_b = CustomerGroup.objects.create(name='B')
+        self.shop = BusinessCategory.objects.create(profession_type='business', name='Shop', thumbnail='b/shop.png')
+        self.cafe = BusinessCategory.objects.create(profession_type='business', name='Cafe', thumbnail='b/cafe.png')
+        event = Event.objects.create(name='Event', event_date=date.today())
+
+        self.posts = {
+            group: Post.objects.create(event=event, group=group, file='post/post.png')
+            for group in (self.group_a, self.group_b)
+        }
+        self.business_posts = {
+            category: BusinessPost.objects.create(
+                business_category=category, profession_type='business', group=self.group_a,
+                file='business_post/post.png'
+            )
+            for category in (self.shop, self.cafe)
+        }
+        self.frame = CustomerFrame.objects.create(
+            customer=self.user, group=self.group_a, business_category=self.shop, profession_type='business',
+            frame_img='customer_frame/frame.png'
+        )
+        for post in self.posts.values():
+            fan_out_post('post', post.id)
+        for post in self.business_posts.values():
+            fan_out_post('business_post', post.id)
+
+    def mapped_posts(self, model):
+        return set(model.objects.filter(customer_frame=self.frame).values_list('post_id', flat=True))
+
+    def test_fan_out_maps_matching_frames_only(self):
+        self.assertEqual(self.mapped_posts(CustomerPostFrameMapping), {self.posts[self.group_a].id})
+        self.assertEqual(self.mapped_posts(BusinessPostFrameMapping), {self.business_posts[self.shop].id})
+        # Idempotent: a retried fan-out creates nothing
+        self.assertEqual(fan_out_post('post', self.posts[self.group_a].id), 0)
+
+    def test_group_change_replaces_mappings(self):
+        self.frame.group = self.group_b
+        self.frame.save()
+        summary = sync_frame_mappings(self.frame.id)
+
+        self.assertEqual(summary['post'], (1, 0, 1))
+        self.assertEqual(self.mapped_posts(CustomerPostFrameMapping), {self.posts[self.group_b].id})
+        # Business posts are of group A too, so they go as well
+        self.assertEqual(self.mapped_posts(BusinessPostFrameMapping), set())
+
+    def test_business_category_change_replaces_mappings(self):
+        self.frame.business_category = self.cafe
+        self.frame.save()
+        summary = sync_frame_mappings(self.frame.id)
+
+        self.assertEqual(summary['business_post'], (1, 0, 1))
+        self.assertEqual(self.mapped_posts(BusinessPostFrameMapping), {self.business_posts[self.cafe].id})
+        self.assertEqual(self.mapped_posts(CustomerPostFrameMapping), {self.posts[self.group_a].id})
+
+    def test_frame_image_change_resets_downloads(self):
+        CustomerPostFrameMapping.objects.filter(customer_frame=self.frame).update(is_downloaded=True)
+        summary = sync_frame_mappings(self.frame.id, reset_downloads=True)
+
+        self.assertEqual(summary['post'], (0, 1, 0))
+        self.assertFalse(CustomerPostFrameMapping.objects.filter(customer_frame=self.frame, is_downloaded=True))
+        self.assertFalse(CustomerFeedItem.objects.filter(customer_frame=self.frame, is_downloaded=True))
+
+    def test_downloads_total_follows_deleted_and_reset_mappings(self):
+        for mapping in CustomerPostFrameMapping.objects.filter(customer_frame=self.frame):
+            mapping.is_downloaded = True
+            mapping.save()
+        self.assertEqual(stats.totals([stats.DOWNLOADS])[stats.DOWNLOADS], 1)
+
+        self.frame.group = self.group_b
+        self.frame.save()
+        sync_frame_mappings(self.frame.id)
+        self.assertEqual(stats.totals([stats.DOWNLOADS])[stats.DOWNLOADS], 0)
+
+        mapping = CustomerPostFrameMapping.objects.get(customer_frame=self.frame)
+        mapping.is_downloaded = True
+        mapping.save()
+        sync_frame_mappings(self.frame.id, reset_downloads=True)
+        self.assertEqual(stats.totals([stats.DOWNLOADS])[stats.DOWNLOADS], 0)
+
+    def test_feed_rows_are_rebuilt(self):
+        self.frame.group = self.group_b
+        self.frame.save()
+        sync_frame_mappings(self.frame.id)
+
+        feed = CustomerFeedItem.objects.filter(customer_frame=self.frame)
+        self.assertEqual(list(feed.values_list('kind', 'post_id')), [('post', self.posts[self.group_b].id)])
+
+
+class PurgePastEventsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='customer@example.com', password='password', user_type='customer')
+        group = CustomerGroup.objects.create(name='A')
+        frame = CustomerFrame.objects.create(customer=self.user, group=group, frame_img='customer_frame/frame.png')
+        self.past = Event.objects.create(name='Past', event_date=date.today() - timedelta(days=1))
+        self.today = Event.objects.create(name='Today', event_date=date.today())
+        for event in (self.past, self.today):
+            for _ in range(3):
+                post = Post.objects.create(event=event, group=group, file='post/post.png')
+                CustomerPostFrameMapping.objects.create(customer=self.user, post=post, customer_frame=frame)
+
+    def test_only_past_events_are_purged(self):
+        summary = purge_past_events(batch_size=2, delete_files=False)
+
+        self.assertEqual(summary['events'][0], 1)
+        self.assertEqual(summary['posts'][0], 3)
+        self.assertEqual(summary['post mappings'][0], 3)
+        self.assertFalse(Event.objects.filter(pk=self.past.pk).exists())
+        self.assertEqual(Post.objects.filter(event=self.today).count(), 3)
+        self.assertEqual(CustomerPostFrameMapping.objects.count(), 3)
+        # The purge bypasses the stat signals; the rollups are recounted
+        self.assertEqual(stats.totals([stats.POSTS])[stats.POSTS], 3)
+
+
+class OutputVideoStatusTests(APITestCase):
+    job_id = 'a' * 64
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='customer@example.com', password='password', user_type='customer')
+        other = User.objects.create_user(email='other@example.com', password='password', user_type='customer')
+        # A render another customer requested, still running
+        grant_render_status(other.id, self.job_id)
+        cache.set(f'render_lock_{self.job_id}', True)
+        self.addCleanup(cache.delete, f'render_lock_{self.job_id}')
+        self.client.force_authenticate(self.user)
+
+    def test_status_is_scoped_to_the_requesting_customer(self):
+        url = f'/api/post/generate_output_video/{self.job_id}'
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        grant_render_status(self.user.id, self.job_id)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['message'], 'Video processing in progress.')
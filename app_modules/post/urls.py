@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from . import views
 from rest_framework import routers
 
@@ -20,7 +20,10 @@ router.register('business-post-frame', views.BusinessPostFrameMappingViewSet, ba
 urlpatterns = [
     path('', include(router.urls)),
     path('event-list', views.EventListApiView.as_view(), name='event-list'),
+    path('customer-feed', views.CustomerFeedApiView.as_view(), name='customer-feed'),
     path('category-list', views.CategoryListApiView.as_view(), name='category-list'),
     path('generate_output_video', views.generate_output_video, name='generate_output_video'),
+    re_path(r'^generate_output_video/(?P<job_id>[0-9a-f]{64})$', views.output_video_status,
+            name='output_video_status'),
     path('delete-past-events', views.DeletePastEventsView.as_view(), name='delete_past_events'),
 ]
@@ -1,13 +1,12 @@
 from datetime import date, timedelta
 
-from django.core.cache import cache
-from django.db.models import Q
+from django.db.models import Q, Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.decorators import api_view
 from rest_framework.exceptions import ValidationError
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -15,15 +14,30 @@ from account.models import CustomerGroup, CustomerFrame
 
 from app_modules.post import serializers
 from app_modules.post.models import Category, Event, Post, OtherPost, CustomerPostFrameMapping, \
-    CustomerOtherPostFrameMapping, BusinessPost, BusinessPostFrameMapping, BusinessCategory
-from lib.helpers import generate_video_with_frame
-from lib.viewsets import BaseModelViewSet
+    CustomerOtherPostFrameMapping, BusinessPost, BusinessPostFrameMapping, BusinessCategory, CustomerFeedItem
+from app_modules.post.render import request_render, get_cached_render, is_render_pending, grant_render_status, \
+    can_view_render_status
+from app_modules.post.tasks import purge_past_events
+from lib.search import TrigramSearchFilter
+from lib.viewsets import BaseModelViewSet, ProjectionListMixin, StreamingListMixin
 from .filters import EventFilter, BusinessPostFilter, BusinessCategoryFilter
 
 
+def with_sub_categories(queryset):
+    # Loads the subcategories of the whole page in one query for CategorySerializer
+    return queryset.prefetch_related(
+        'renditions',
+        Prefetch(
+            'category_set',
+            queryset=Category.objects.prefetch_related('renditions').order_by('id'),
+            to_attr='prefetched_sub_categories'
+        )
+    )
+
+
 class CategoryView(BaseModelViewSet):
     serializer_class = serializers.CategorySerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, OrderingFilter]
     filterset_fields = {
         'name': ["in", "exact"]
     }
@@ -39,12 +53,12 @@ class CategoryView(BaseModelViewSet):
 
         if file_type:
             queryset = Category.objects.filter(other_post_categories__file_type=file_type).distinct()
-        return queryset
+        return with_sub_categories(queryset)
 
     @action(detail=True, methods=['get'])
     def subcategories(self, request, pk=None):
         category = self.get_object()
-        subcategories = Category.objects.filter(sub_category=category)
+        subcategories = with_sub_categories(Category.objects.filter(sub_category=category))
         serializer = self.get_serializer(subcategories, many=True)
         return Response(serializer.data)
 
@@ -59,24 +73,24 @@ class CategoryView(BaseModelViewSet):
             return Response({"success": False, "message": "Subcategory not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class SubcategoryViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Category.objects.filter(sub_category__isnull=False).order_by('-id')
+class SubcategoryViewSet(StreamingListMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Category.objects.filter(sub_category__isnull=False).prefetch_related('renditions').order_by('-id')
     serializer_class = serializers.SubcategorySerializer
     pagination_class = None
 
 
 class BusinessCategoeryViewset(BaseModelViewSet):
-    queryset = BusinessCategory.objects.all().order_by('-id')
+    queryset = BusinessCategory.objects.prefetch_related('renditions').order_by('-id')
     serializer_class = serializers.BusinessCategorySerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     search_fields = ('name', 'profession_type')
     filterset_class = BusinessCategoryFilter
 
 
 class BusinessCategoryList(viewsets.ReadOnlyModelViewSet):
-    queryset = BusinessCategory.objects.all().order_by('-id')
+    queryset = BusinessCategory.objects.prefetch_related('renditions').order_by('-id')
     serializer_class = serializers.BusinessCategorySerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     search_fields = ('name', 'profession_type')
     pagination_class = None
 
@@ -85,7 +99,7 @@ class EventViewset(BaseModelViewSet):
     # queryset = Event.objects.all()
     serializer_class = serializers.EventSerializer
     filterset_class = EventFilter
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     search_fields = ('event_date', 'name', 'event_type')
 
     def get_queryset(self):
@@ -95,7 +109,7 @@ class EventViewset(BaseModelViewSet):
         tomorrow = today + timedelta(days=1)
         five_days_from_today = today + timedelta(days=5)
 
-        queryset = Event.objects.all().order_by('event_date')
+        queryset = Event.objects.prefetch_related('renditions').order_by('event_date')
 
         if date_type == "today":
             queryset = queryset.filter(event_date=today)
@@ -111,10 +125,11 @@ class EventViewset(BaseModelViewSet):
 
 
 class PostViewset(BaseModelViewSet):
-    queryset = Post.objects.select_related('event', 'group').all().order_by('-id')
+    queryset = Post.objects.select_related('event', 'group').prefetch_related('renditions').order_by('-id')
     serializer_class = serializers.PostSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, OrderingFilter]
     search_fields = ['group__name', 'event__name', 'file_type', 'event__event_date']
+    keyset_ordering = ('-id',)
 
     def get_serializer_context(self):
         context = super(PostViewset, self).get_serializer_context()
@@ -148,15 +163,15 @@ class PostViewset(BaseModelViewSet):
 
 
 class OtherPostViewset(BaseModelViewSet):
-    queryset = OtherPost.objects.select_related('category', 'group').all().order_by('-id')
+    queryset = OtherPost.objects.select_related('category', 'group').prefetch_related('renditions').order_by('-id')
     serializer_class = serializers.OtherPostSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     search_fields = ['group__name', 'category__name', 'file_type']
 
 
 class BusinessPostViewset(viewsets.ModelViewSet):
     serializer_class = serializers.BusinessPostSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     search_fields = [
         'group__name', 'file_type', 'business_category__name', 'profession_type'
     ]
@@ -190,79 +205,142 @@ class BusinessPostViewset(viewsets.ModelViewSet):
         return queryset
     
 
-class CustomerPostFrameMappingViewSet(BaseModelViewSet):
+FRAME_IMAGE_STORAGE = CustomerFrame._meta.get_field('frame_img').storage
+
+
+class CustomerPostFrameMappingViewSet(ProjectionListMixin, BaseModelViewSet):
     queryset = CustomerPostFrameMapping.objects
     serializer_class = serializers.CustomerPostFrameMappingSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     search_fields = ['post__event__event_date']
     filterset_fields = ['is_downloaded']
     http_method_names = ['get', 'patch']
+    keyset_ordering = ('-id',)
+    projection = {
+        'id': 'id',
+        'customer': 'customer_id',
+        'post': 'post_id',
+        'customer_frame': 'customer_frame_id',
+        'is_downloaded': 'is_downloaded',
+        'post_image': 'post__file',
+        'frame_image': 'customer_frame__frame_img',
+        'event_name': 'post__event__name',
+    }
+    projection_file_fields = {
+        'post_image': Post._meta.get_field('file').storage,
+        'frame_image': FRAME_IMAGE_STORAGE,
+    }
 
     def get_serializer_context(self):
         context = super(CustomerPostFrameMappingViewSet, self).get_serializer_context()
         context["user"] = self.request.user
         return context
 
+    def get_projection_constants(self):
+        # Same values CustomerPostFrameMappingSerializer returns for every row
+        return {'customer_number': self.request.user.whatsapp_number, 'is_a_group': "True"}
+
     def get_queryset(self):
         customer = self.request.user
         event_id = self.request.query_params.get('event_id')
 
-        queryset = self.queryset.prefetch_related('customer', 'post', 'customer_frame')
+        queryset = self.queryset.select_related('post__event', 'customer_frame__group').filter(
+            customer=customer
+        ).order_by('-id')
         if event_id:
-            queryset = queryset.filter(customer=customer, post__event=event_id)
+            queryset = queryset.filter(post__event=event_id)
 
         return queryset
 
 
-class CustomerOtherPostFrameMappingViewSet(BaseModelViewSet):
+class CustomerOtherPostFrameMappingViewSet(ProjectionListMixin, BaseModelViewSet):
     queryset = CustomerOtherPostFrameMapping.objects
     serializer_class = serializers.CustomerOtherPostFrameMappingSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    search_fields = ['other_post__name']
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
+    search_fields = ['other_post__category__name']
     filterset_fields = ['is_downloaded']
     http_method_names = ['get', 'patch']
+    keyset_ordering = ('-id',)
+    projection = {
+        'id': 'id',
+        'customer': 'customer_id',
+        'other_post': 'other_post_id',
+        'customer_frame': 'customer_frame_id',
+        'is_downloaded': 'is_downloaded',
+        'post_image': 'other_post__file',
+        'frame_image': 'customer_frame__frame_img',
+    }
+    projection_file_fields = {
+        'post_image': OtherPost._meta.get_field('file').storage,
+        'frame_image': FRAME_IMAGE_STORAGE,
+    }
 
     def get_serializer_context(self):
         context = super(CustomerOtherPostFrameMappingViewSet, self).get_serializer_context()
         context["user"] = self.request.user
         return context
 
+    def get_projection_constants(self):
+        # Same value CustomerOtherPostFrameMappingSerializer returns for every row
+        return {'is_a_group': True}
+
     def get_queryset(self):
         customer = self.request.user
         categoery_id = self.request.query_params.get('categoery_id')
 
-        queryset = self.queryset.prefetch_related('customer', 'other_post', 'customer_frame')
+        queryset = self.queryset.select_related('other_post', 'customer_frame__group').filter(
+            customer=customer
+        ).order_by('-id')
         if categoery_id:
-            queryset = queryset.filter(customer=customer, other_post__category=categoery_id)
+            queryset = queryset.filter(other_post__category=categoery_id)
 
         return queryset
 
 
-class BusinessPostFrameMappingViewSet(BaseModelViewSet):
+class BusinessPostFrameMappingViewSet(ProjectionListMixin, BaseModelViewSet):
     queryset = BusinessPostFrameMapping.objects
     serializer_class = serializers.BusinessPostFrameMappingSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_fields = ['is_downloaded']
     http_method_names = ['get', 'patch']
+    keyset_ordering = ('-id',)
+    projection = {
+        'id': 'id',
+        'customer': 'customer_id',
+        'post': 'post_id',
+        'customer_frame': 'customer_frame_id',
+        'is_downloaded': 'is_downloaded',
+        'post_image': 'post__file',
+        'frame_image': 'customer_frame__frame_img',
+    }
+    projection_file_fields = {
+        'post_image': BusinessPost._meta.get_field('file').storage,
+        'frame_image': FRAME_IMAGE_STORAGE,
+    }
 
     def get_serializer_context(self):
         context = super(BusinessPostFrameMappingViewSet, self).get_serializer_context()
         context["user"] = self.request.user
         return context
 
+    def get_projection_constants(self):
+        # Same values BusinessPostFrameMappingSerializer returns for every row
+        return {'customer_number': self.request.user.whatsapp_number, 'is_a_group': "True"}
+
     def get_queryset(self):
         customer = self.request.user
         business_post_id = self.request.query_params.get('business_post_id')
 
-        queryset = self.queryset.prefetch_related('customer', 'post', 'customer_frame')
+        queryset = self.queryset.select_related('post', 'customer_frame__group').filter(
+            customer=customer
+        ).order_by('-id')
         if business_post_id:
-            queryset = queryset.filter(customer=customer, post__business_category=business_post_id)
+            queryset = queryset.filter(post__business_category=business_post_id)
 
         return queryset
 
 
-
-class EventListApiView(ListAPIView):
+class EventListApiView(StreamingListMixin, ListAPIView):
     pagination_class = None
     serializer_class = serializers.EventSerializer
 
@@ -270,7 +348,7 @@ class EventListApiView(ListAPIView):
         event_type = self.request.query_params.get('event_type', None)
 
         today = date.today()
-        queryset = Event.objects.filter(event_date__gte=today).order_by('-id')
+        queryset = Event.objects.filter(event_date__gte=today).prefetch_related('renditions').order_by('-id')
 
         if event_type == 'image':
             queryset = queryset.filter(event_type='image')
@@ -281,10 +359,67 @@ class EventListApiView(ListAPIView):
         return queryset
 
 
-class CategoryListApiView(ListAPIView):
+class CustomerFeedApiView(ProjectionListMixin, ListAPIView):
+    """
+    The customer's whole feed in one indexed read of CustomerFeedItem:
+    event posts bucketed like EventViewset (today, tomorrow, upcoming up to
+    five days ahead), followed by other posts and business posts.
+    """
+    pagination_class = None
+    projection = {
+        'id': 'mapping_id',
+        'kind': 'kind',
+        'customer_frame': 'customer_frame_id',
+        'post': 'post_id',
+        'other_post': 'other_post_id',
+        'business_post': 'business_post_id',
+        'event': 'event_id',
+        'event_name': 'event_name',
+        'event_type': 'event_type',
+        'event_date': 'feed_date',
+        'category': 'category_id',
+        'category_name': 'category_name',
+        'file_type': 'file_type',
+        'post_image': 'file',
+        'frame_image': 'frame_img',
+        'is_downloaded': 'is_downloaded',
+    }
+    projection_file_fields = {
+        'post_image': Post._meta.get_field('file').storage,
+        'frame_image': FRAME_IMAGE_STORAGE,
+    }
+
+    def get_queryset(self):
+        today = date.today()
+        return CustomerFeedItem.objects.filter(
+            Q(feed_date__isnull=True) | Q(feed_date__range=(today, today + timedelta(days=5))),
+            customer=self.request.user,
+        ).order_by('feed_date', '-mapping_id')
+
+    def list(self, request, *args, **kwargs):
+        today = date.today()
+        tomorrow = today + timedelta(days=1)
+        feed = {'today': [], 'tomorrow': [], 'upcoming': [], 'other_posts': [], 'business_posts': []}
+
+        for item in self.project(self.get_queryset().values(*set(self.projection.values()))):
+            if item['kind'] == 'other_post':
+                feed['other_posts'].append(item)
+            elif item['kind'] == 'business_post':
+                feed['business_posts'].append(item)
+            elif item['event_date'] == today:
+                feed['today'].append(item)
+            elif item['event_date'] == tomorrow:
+                feed['tomorrow'].append(item)
+            else:
+                feed['upcoming'].append(item)
+
+        return Response(feed)
+
+
+class CategoryListApiView(StreamingListMixin, ListAPIView):
     pagination_class = None
     serializer_class = serializers.CategorySerializer
-    queryset = Category.objects.select_related('sub_category').all().order_by('-id')
+    queryset = with_sub_categories(Category.objects.select_related('sub_category')).order_by('-id')
 
 
 @api_view(['POST'])
@@ -316,47 +451,45 @@ def generate_output_video(request):
 
     if categoery_id:
         try:
-            data = CustomerPostFrameMapping.objects.get(customer=customer, other_post__category=categoery_id)
-        except CustomerPostFrameMapping.DoesNotExist:
-            return Response({"message": "Invalid category ID."}, status=400, request=request)
+            data = CustomerOtherPostFrameMapping.objects.get(customer=customer, other_post__category=categoery_id)
+        except CustomerOtherPostFrameMapping.DoesNotExist:
+            return Response({"message": "Invalid category ID."}, status=400)
 
-    # Extract the related CustomerFrame and Post objects from the mapping object
+    # Extract the related CustomerFrame and post file from the mapping object
     customer_frame = data.customer_frame
-    post = data.post
+    post = data.other_post if isinstance(data, CustomerOtherPostFrameMapping) else data.post
 
-    # Check if the output video URL is already cached for this user and request data
-    cache_key = f"user_{customer.id}_post_{customer_post_id}_event_{event_id}_category_{categoery_id}"
-    output_video_url = cache.get(cache_key)
+    # Renders are cached by content, so every customer sharing this frame and post reuses one file
+    render_key, output_video_url = request_render(customer_frame, post)
+    if output_video_url:
+        return Response({"message": "Video processing completed.", "output_video": output_video_url}, status=200)
 
-    if not output_video_url:
-        # If the output video URL is not cached, generate the video with the frame
-        output_video_url = generate_video_with_frame(customer_frame, post)
+    grant_render_status(customer.id, render_key)
+    return Response({"message": "Video processing started.", "job_id": render_key, "output_video": None}, status=200)
 
-        # Cache the output video URL for a certain duration (e.g., 1 day)
-        cache.set(cache_key, output_video_url, timeout=86400)
 
-    # Generate the video with the frame overlay using the separate function
-    output_video_url = generate_video_with_frame(customer_frame, post)
+@api_view(['GET'])
+def output_video_status(request, job_id):
+    # Only the customers who requested the render can follow it
+    if not can_view_render_status(request.user.id, job_id):
+        return Response({"message": "Invalid job ID."}, status=404)
 
-    return Response({"message": "Video processing completed.", "output_video": output_video_url}, status=200)
+    output_video_url = get_cached_render(job_id)
+    if output_video_url:
+        return Response({"message": "Video processing completed.", "output_video": output_video_url}, status=200)
 
+    if is_render_pending(job_id):
+        return Response({"message": "Video processing in progress.", "job_id": job_id, "output_video": None},
+                        status=200)
 
-class DeletePastEventsView(APIView):
-    def delete(self, request):
-        today = date.today()
-        events_to_delete = Event.objects.filter(event_date__lt=today)
+    return Response({"message": "Invalid job ID."}, status=404)
 
-        for event in events_to_delete:
-            posts_to_delete = Post.objects.filter(event=event)
 
-            for post in posts_to_delete:
-                mappings_to_delete = CustomerPostFrameMapping.objects.filter(post=post)
-                mappings_to_delete.delete()
-
-            posts_to_delete.delete()
-
-        events_to_delete.delete()
+class DeletePastEventsView(APIView):
+    def delete(self, request):
+        # Purged in batches by a worker; the same task runs nightly from beat
+        result = purge_past_events.delay()
 
         return Response(
-            {'message': 'Successfully deleted past events.'},
+            {'message': 'Past events purge started.', 'task_id': result.id},
         )
@@ -10,6 +10,9 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
 
+# Queue time, run time and rows written of every task, exported on /metrics
+import lib.task_metrics  # noqa: E402,F401
+
 
 @app.task(bind=True)
 def debug_task(self):
@@ -0,0 +1,78 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from account.models import User
+from account.views import UserProfileListApiView
+from lib.search import TrigramSearchFilter
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Ravi', 'Priya', 'Ananya', 'Diya', 'Kavya', 'Rohan', 'Meera']
+LAST_NAMES = ['Patel', 'Shah', 'Mehta', 'Desai', 'Joshi', 'Sharma', 'Verma', 'Iyer', 'Nair', 'Reddy']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'example.in']
+
+
+class Command(BaseCommand):
+    help = ('Compares SearchFilter (UPPER LIKE) with TrigramSearchFilter (pg_trgm) on synthetic customers. '
+            'The synthetic rows are rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Number of synthetic customers to insert.')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per search term and backend.')
+        parser.add_argument('--term', action='append', dest='terms',
+                            help='Search term to benchmark; may be given several times.')
+
+    def create_customers(self, rows):
+        rng = random.Random(0)
+        batch = []
+        for index in range(rows):
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f'{first_name}.{last_name}{index}@{rng.choice(DOMAINS)}'.lower()
+            batch.append(User(
+                username=email, email=email, password='!', user_type='customer',
+                first_name=first_name, last_name=last_name,
+                whatsapp_number=f'9{rng.randrange(10 ** 9):09}', is_verify=rng.random() < 0.7,
+            ))
+            if len(batch) == 5000:
+                User.objects.bulk_create(batch)
+                batch = []
+        User.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {User._meta.db_table}')
+
+    def measure(self, backend, term, repeat):
+        request = Request(APIRequestFactory().get('/', {'search': term}))
+        queryset = backend.filter_queryset(request, User.objects.all(), UserProfileListApiView)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = queryset.count()
+            timings.append((time.perf_counter() - start) * 1000)
+        uses_index = 'Bitmap Index Scan' in queryset.explain()
+        return count, statistics.median(timings), max(timings), uses_index
+
+    def handle(self, *args, **options):
+        terms = options['terms'] or ['9876', 'gmail', 'ravi', 'patel123']
+        with transaction.atomic():
+            self.stdout.write(f'Inserting {options["rows"]} synthetic customers...')
+            self.create_customers(options['rows'])
+
+            for term in terms:
+                results = {
+                    name: self.measure(backend, term, options['repeat'])
+                    for name, backend in (('icontains', SearchFilter()), ('trigram', TrigramSearchFilter()))
+                }
+                for name, (count, median, worst, uses_index) in results.items():
+                    self.stdout.write(
+                        f'{term!r} {name:>9}: {count} rows, median {median:.1f}ms, max {worst:.1f}ms, '
+                        f'{"index scan" if uses_index else "sequential scan"}'
+                    )
+                speedup = results['icontains'][1] / results['trigram'][1] if results['trigram'][1] else 0
+                self.stdout.write(self.style.SUCCESS(f'{term!r}: trigram is {speedup:.1f}x faster'))
+
+            transaction.set_rollback(True)
@@ -2,21 +2,17 @@
 
 from django.core.management.base import BaseCommand
 from django.contrib.sessions.models import Session
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+
+from lib.authentication import revoke_all_tokens
 
 class Command(BaseCommand):
-    help = 'Logs out all users by deleting sessions and blacklisting tokens.'
+    help = 'Logs out all users by deleting sessions and moving the global token epoch.'
 
     def handle(self, *args, **options):
         # Delete all sessions
         Session.objects.all().delete()
 
-        # Blacklist all outstanding tokens
-        tokens = OutstandingToken.objects.all()
-        for token in tokens:
-            try:
-                BlacklistedToken.objects.get(token=token)
-            except BlacklistedToken.DoesNotExist:
-                BlacklistedToken.objects.create(token=token)
+        # Every token issued before now is rejected from here on
+        revoke_all_tokens()
 
         self.stdout.write(self.style.SUCCESS('Successfully logged out all users.'))
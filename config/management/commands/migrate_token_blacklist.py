@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from lib.authentication import token_generation_key, invalidate_cached_user
+
+OUTSTANDING_TABLE = 'token_blacklist_outstandingtoken'
+BLACKLISTED_TABLE = 'token_blacklist_blacklistedtoken'
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves simplejwt blacklist rows to token generations: every user with an unexpired blacklisted '
+        'token gets a new generation, which revokes all of their current tokens.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge', action='store_true',
+                            help='Empty the blacklist tables once the users are migrated.')
+
+    def handle(self, *args, **options):
+        tables = connection.introspection.table_names()
+        if OUTSTANDING_TABLE not in tables or BLACKLISTED_TABLE not in tables:
+            self.stdout.write('No token blacklist tables found, nothing to migrate.')
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT DISTINCT o.user_id FROM {OUTSTANDING_TABLE} o '
+                f'JOIN {BLACKLISTED_TABLE} b ON b.token_id = o.id '
+                f'WHERE o.user_id IS NOT NULL AND o.expires_at > now()'
+            )
+            user_ids = [row[0] for row in cursor.fetchall()]
+
+        with transaction.atomic():
+            migrated = get_user_model().objects.filter(pk__in=user_ids).update(
+                token_generation=F('token_generation') + 1
+            )
+            if options['purge']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'TRUNCATE {BLACKLISTED_TABLE}, {OUTSTANDING_TABLE}')
+
+        # Cached generations of the migrated users are stale now
+        cache.delete_many([token_generation_key(user_id) for user_id in user_ids])
+        for user_id in user_ids:
+            invalidate_cached_user(user_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Migrated {migrated} users from the token blacklist.'))
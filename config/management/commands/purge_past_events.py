@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from app_modules.post.purge import PURGE_BATCH_SIZE, purge_past_events, collect_orphan_files
+
+
+class Command(BaseCommand):
+    help = 'Deletes past events with their posts, mappings and files in batches, then collects orphaned media.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE,
+                            help='Number of ids covered by one DELETE statement.')
+        parser.add_argument('--keep-files', action='store_true',
+                            help='Delete rows only; leave media files and orphans on disk.')
+
+    def handle(self, *args, **options):
+        keep_files = options['keep_files']
+
+        def report(label, rows):
+            self.stdout.write(f'{label}: deleted {rows} rows')
+
+        summary = purge_past_events(
+            batch_size=options['batch_size'], delete_files=not keep_files, on_batch=report
+        )
+        for label, (rows, seconds) in summary.items():
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f'{label}: {rows} rows in {seconds:.1f}s ({rate:.0f} rows/sec)')
+
+        if not keep_files:
+            for directory, removed in collect_orphan_files().items():
+                self.stdout.write(f'{directory}/: removed {removed} orphaned files')
+
+        self.stdout.write(self.style.SUCCESS('Successfully purged past events.'))
@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from lib.metrics import histogram_quantile, parse_sample, registry
+from lib.task_metrics import TASK_QUEUE_TIME, TASK_ROWS_WRITTEN, TASK_RUN_TIME, TASK_RUNS
+
+
+class Command(BaseCommand):
+    help = 'Summarises Celery task metrics per task: runs, failures, queue time, run time and rows written.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', help='Only show tasks whose name contains this text.')
+        parser.add_argument('--reset', action='store_true', help='Clear all collected metrics after printing.')
+
+    def handle(self, *args, **options):
+        _, samples = registry.read()
+
+        tasks = defaultdict(lambda: {
+            'states': defaultdict(int), 'rows': 0,
+            TASK_QUEUE_TIME.name: {'buckets': [], 'sum': 0.0, 'count': 0},
+            TASK_RUN_TIME.name: {'buckets': [], 'sum': 0.0, 'count': 0},
+        })
+        for sample, value in samples.items():
+            name, labels = parse_sample(sample)
+            task = labels.get('task')
+            if task is None or (options['task'] and options['task'] not in task):
+                continue
+            if name == TASK_RUNS.name:
+                tasks[task]['states'][labels['state']] += int(value)
+            elif name == TASK_ROWS_WRITTEN.name:
+                tasks[task]['rows'] += int(value)
+            for histogram in (TASK_QUEUE_TIME.name, TASK_RUN_TIME.name):
+                if name == f'{histogram}_bucket':
+                    tasks[task][histogram]['buckets'].append((float(labels['le']), value))
+                elif name == f'{histogram}_sum':
+                    tasks[task][histogram]['sum'] = value
+                elif name == f'{histogram}_count':
+                    tasks[task][histogram]['count'] = int(value)
+
+        if not tasks:
+            self.stdout.write('No task metrics collected yet.')
+        for task in sorted(tasks):
+            stats = tasks[task]
+            runs = sum(stats['states'].values())
+            failures = stats['states'].get('FAILURE', 0)
+            self.stdout.write(self.style.MIGRATE_HEADING(task))
+            self.stdout.write(
+                f'  runs: {runs}, failures: {failures} ({failures / runs:.1%})' if runs else '  runs: 0'
+            )
+            for label, histogram in (('queue time', TASK_QUEUE_TIME.name), ('run time', TASK_RUN_TIME.name)):
+                self.stdout.write(f'  {label}: {self.describe(stats[histogram])}')
+            self.stdout.write(f'  rows written: {stats["rows"]} ({stats["rows"] / runs:.0f}/run)' if runs
+                              else f'  rows written: {stats["rows"]}')
+
+        if options['reset']:
+            registry.reset()
+            self.stdout.write(self.style.SUCCESS('Metrics cleared.'))
+
+    @staticmethod
+    def describe(histogram):
+        if not histogram['count']:
+            return 'no data'
+        mean = histogram['sum'] / histogram['count']
+        p50, p95 = (histogram_quantile(q, histogram['buckets']) for q in (0.5, 0.95))
+        return f'mean {mean:.2f}s, p50 ~{p50:.2f}s, p95 ~{p95:.2f}s'
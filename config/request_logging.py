@@ -0,0 +1,100 @@
+"""
+Non-blocking JSON-lines logging.
+
+``QueuedFileHandler`` only puts records on an in-memory queue; a
+``QueueListener`` thread formats them and appends them to the file. A
+request never waits on disk I/O, and when the queue is full records are
+dropped (and counted) rather than blocking the request.
+
+Every gunicorn and Celery worker process appends to the same file, so the
+processes must not rotate it themselves: renames from several processes
+would race and lose records. Rotation is left to logrotate (without
+copytruncate); the ``WatchedFileHandler`` of each process notices the file
+was moved and reopens it, e.g.::
+
+    /srv/app/api_requests.log /srv/app/api_errors.log {
+        size 50M
+        rotate 5
+        compress
+        delaycompress
+        missingok
+    }
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, message and every
+    field passed through ``extra``.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class QueuedFileHandler(QueueHandler):
+    def __init__(self, filename, queue_size=10000):
+        self.target = WatchedFileHandler(filename, delay=True)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.listener = None
+        self.running = False
+        super().__init__(queue.Queue(queue_size))
+        self.start()
+        atexit.register(self.stop)
+
+    def start(self):
+        # Worker processes forked after configuration (gunicorn, celery) get a
+        # fresh queue and listener thread of their own
+        self.pid = os.getpid()
+        if self.listener is not None:
+            self.queue = queue.Queue(self.queue_size)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self.running = True
+
+    def stop(self):
+        # Flushes what is still queued; called at exit and on close
+        if self.running and self.pid == os.getpid():
+            self.listener.stop()
+            self.running = False
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, not in the request
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        return copy.copy(record)
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.stop()
+        self.target.close()
+        super().close()
@@ -4,6 +4,7 @@ import sys
 from pathlib import Path
 
 import environ
+from celery.schedules import crontab
 
 # -------------------------------------------------------------------
 env = environ.Env()
@@ -25,7 +26,8 @@ AUTH_USER_MODEL = 'account.User'
 
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        # django_redis.cache.RedisCache counting hits and misses for /metrics
+        "BACKEND": "lib.cache.InstrumentedRedisCache",
         "LOCATION": env('REDIS_HOST_URL'),
     }
 }
@@ -64,6 +66,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     # "silk.middleware.SilkyMiddleware",
+    "config.middleware.MetricsMiddleware",
     "config.middleware.APILoggingMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -169,7 +172,8 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # EMAIL
 # ------------------------------------------------------------------------------
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# The locmem or filebased backend stands in for SMTP locally
+EMAIL_BACKEND = env.str("EMAIL_BACKEND", default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_USE_TLS = True
 EMAIL_PORT = 587
@@ -183,7 +187,7 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'lib.authentication.CachedJWTAuthentication',
     ],
     "DEFAULT_RENDERER_CLASSES": [
         "lib.renderer.CustomRenderer",
@@ -201,7 +205,13 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION",
+    # Issue tokens carrying the user's token generation, and refuse to refresh revoked ones
+    "TOKEN_OBTAIN_SERIALIZER": "lib.authentication.GenerationTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "lib.authentication.GenerationTokenRefreshSerializer",
 }
+# Authenticated users are cached in Redis and, for a shorter time, in every worker (seconds)
+AUTH_USER_CACHE_TIMEOUT = 60 * 5
+AUTH_USER_LOCAL_TTL = 30
 
 # ---------------------------- Celery Configuration ------------------------
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
@@ -212,6 +222,102 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Kolkata'
 
+# Tasks run on named queues, each served by its own worker pool so slow
+# renders never hold up mapping jobs or OTP emails, e.g.:
+#   celery -A config worker -Q mapping --concurrency=4 -n mapping@%h
+#   celery -A config worker -Q render --concurrency=2 -n render@%h
+#   celery -A config worker -Q media,email --concurrency=4 -n media@%h
+#   celery -A config worker -Q maintenance,celery --concurrency=1 -n maintenance@%h
+CELERY_TASK_ROUTES = {
+    'app_modules.post.tasks.map_*': {'queue': 'mapping'},
+    'app_modules.post.tasks.refresh_*': {'queue': 'mapping'},
+    # The account app is registered as "account", so its tasks are named account.tasks.*
+    'account.tasks.sync_customer_frame_mappings': {'queue': 'mapping'},
+    'app_modules.post.tasks.render_video_with_frame': {'queue': 'render'},
+    'app_modules.post.task.process_video': {'queue': 'render'},
+    'app_modules.master.tasks.generate_image_renditions': {'queue': 'media'},
+    'app_modules.master.tasks.store_media_metadata': {'queue': 'media'},
+    'app_modules.master.tasks.deliver_outgoing_emails': {'queue': 'email'},
+    'app_modules.post.tasks.evict_rendered_videos': {'queue': 'maintenance'},
+    'app_modules.post.tasks.purge_*': {'queue': 'maintenance'},
+    'app_modules.post.tasks.collect_orphan_media': {'queue': 'maintenance'},
+    'app_modules.master.tasks.reconcile_stat_rollups': {'queue': 'maintenance'},
+    'app_modules.master.tasks.prune_task_results': {'queue': 'maintenance'},
+    # run_coalesced_batch goes to the queue of its Coalescer (lib.dispatch)
+}
+# Redis emulates priorities with one list per step, and serves 0 first
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+CELERY_TASK_DEFAULT_PRIORITY = 5
+# Reserve one task per process at a time, so priorities and long renders
+# don't leave queued work stuck behind a busy process
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Only tasks that declare ignore_result=False (progress reporting, purge
+# status) store results. Stored results are pruned in batches by
+# prune_task_results instead of celery's unbatched backend_cleanup.
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_RESULT_EXPIRES = None
+TASK_RESULT_MAX_AGE = datetime.timedelta(days=3)
+
+CELERY_BEAT_SCHEDULE = {
+    'evict-rendered-videos': {
+        'task': 'app_modules.post.tasks.evict_rendered_videos',
+        'schedule': datetime.timedelta(hours=1),
+    },
+    'purge-past-events': {
+        'task': 'app_modules.post.tasks.purge_past_events',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'collect-orphan-media': {
+        'task': 'app_modules.post.tasks.collect_orphan_media',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'reconcile-stat-rollups': {
+        'task': 'app_modules.master.tasks.reconcile_stat_rollups',
+        'schedule': crontab(hour=0, minute=15),
+    },
+    'deliver-outgoing-emails': {
+        'task': 'app_modules.master.tasks.deliver_outgoing_emails',
+        'schedule': datetime.timedelta(minutes=1),
+        # A run still queued when the next one is due is dropped
+        'options': {'expires': 60},
+    },
+    'purge-expired-feed-items': {
+        'task': 'app_modules.post.tasks.purge_expired_feed_items',
+        'schedule': datetime.timedelta(days=1),
+    },
+    'prune-task-results': {
+        'task': 'app_modules.master.tasks.prune_task_results',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
+
+# ---------------------------- Video Render Cache ------------------------
+RENDER_CACHE_MAX_BYTES = env.int("RENDER_CACHE_MAX_BYTES", default=10 * 1024 ** 3)
+RENDER_LOCK_TIMEOUT = 60 * 15
+# How long a customer can poll the status of a render they requested
+RENDER_JOB_TIMEOUT = 60 * 60 * 24
+# Celery priorities of renders (0 is served first): renders of today's event
+# posts go ahead of the rest
+RENDER_PRIORITY_TODAY = 0
+RENDER_PRIORITY = 6
+# Renders unused for this long are collected as orphans (seconds)
+RENDER_ORPHAN_MAX_AGE = env.int("RENDER_ORPHAN_MAX_AGE", default=60 * 60 * 24 * 7)
+# One of lib.video.VIDEO_PRESETS: fast, balanced or quality
+VIDEO_RENDER_PRESET = env.str("VIDEO_RENDER_PRESET", default="balanced")
+
+# ---------------------------- Image Renditions ------------------------
+IMAGE_RENDITION_WIDTHS = [320, 640, 1080]
+# Format -> encoder quality. Formats the installed Pillow cannot encode are skipped.
+IMAGE_RENDITION_FORMATS = {
+    "webp": 80,
+    "avif": 60,
+}
+
 
 CORS_ORIGIN_ALLOW_ALL = False
 CORS_ORIGIN_WHITELIST = [
@@ -306,7 +412,16 @@ SWAGGER_SETTINGS = {
     ],
 }
 
-# settings.py
+# ------------------------------- Metrics ------------------------------
+# How often each process adds its in-memory metrics to the shared Redis hash
+METRICS_FLUSH_INTERVAL = env.int("METRICS_FLUSH_INTERVAL", default=10)
+METRICS_REDIS_ALIAS = "default"
+
+# ------------------------------- Logging ------------------------------
+# Share of successful (2xx) requests written to api_requests.log; others are always logged
+REQUEST_LOG_SAMPLE_RATE = env.float("REQUEST_LOG_SAMPLE_RATE", default=1.0)
+# Request headers copied into the request log; credentials and cookies are never logged
+REQUEST_LOG_HEADERS = ['User-Agent', 'X-Forwarded-For', 'Referer', 'Content-Type', 'Content-Length', 'X-Request-Id']
 
 LOGGING = {
     'version': 1,
@@ -320,19 +435,23 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json_lines': {
+            '()': 'config.request_logging.JsonLinesFormatter',
+        },
     },
+    # Shared by every worker process and rotated by logrotate, see config.request_logging
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'config.request_logging.QueuedFileHandler',
             'filename': 'api_requests.log',
-            'formatter': 'verbose',
+            'formatter': 'json_lines',
         },
         'error_file': {
             'level': 'ERROR',
-            'class': 'logging.FileHandler',
+            'class': 'config.request_logging.QueuedFileHandler',
             'filename': 'api_errors.log',
-            'formatter': 'verbose',
+            'formatter': 'json_lines',
         },
     },
     'loggers': {
@@ -346,10 +465,15 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'api.requests': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'api_errors': {
             'handlers': ['error_file'],
             'level': 'ERROR',
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
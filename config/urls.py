@@ -12,6 +12,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from app_modules.master.views import MetricsView
+
 schema_view = get_schema_view(
    openapi.Info(
       title="Alpha Design Spot API",
@@ -31,6 +33,7 @@ urlpatterns = [
     # path('silk/', include('silk.urls', namespace='silk')),
     path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path("__debug__/", include("debug_toolbar.urls")),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     # jwt
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
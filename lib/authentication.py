@@ -0,0 +1,224 @@
+"""
+JWT authentication with cached users and O(1) token revocation.
+
+Users are resolved from a per-worker cache, then from Redis, and only then
+from the database. Both caches are keyed by user id and the user's auth
+version, a counter in Redis bumped by ``invalidate_cached_user`` whenever the
+user row changes (profile edits, soft deletes, password changes).
+
+Tokens carry the user's ``token_generation``. Logging a user out bumps the
+generation, and logging everyone out moves the global token epoch; a token is
+accepted only while its generation is current and it was issued after the
+epoch. Versions, generations and the epoch are fetched from Redis in one
+round trip per request, falling back to the database when evicted.
+"""
+import copy
+import datetime
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+TOKEN_GENERATION_CLAIM = 'gen'
+TOKEN_EPOCH_KEY = 'token_epoch'
+
+
+def auth_version_key(user_id):
+    return f"auth_version_{user_id}"
+
+
+def cached_user_key(user_id, version):
+    return f"auth_user_{user_id}_{version}"
+
+
+def token_generation_key(user_id):
+    return f"token_generation_{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    """
+    Bump the user's auth version; entries cached under older versions are
+    never read again and expire on their own.
+    """
+    key = auth_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+# ------------------------------ revocation ------------------------------
+
+def revoke_user_tokens(user_id):
+    """
+    Revoke every token issued to the user so far with a single UPDATE.
+    """
+    users = get_user_model().objects.filter(pk=user_id)
+    users.update(token_generation=F('token_generation') + 1)
+    # The UPDATE holds the row lock, so this reads our own increment
+    generation = users.values_list('token_generation', flat=True).first()
+
+    def publish():
+        # Overwrite rather than delete: a request that read the old generation
+        # before the commit must not be able to cache it again
+        cache.set(token_generation_key(user_id), generation, None)
+        invalidate_cached_user(user_id)
+    transaction.on_commit(publish)
+
+
+def revoke_all_tokens():
+    """
+    Revoke every token issued until now, for every user.
+    """
+    from account.models import TokenEpoch
+
+    issued_before = timezone.now()
+    TokenEpoch.objects.update_or_create(pk=1, defaults={'issued_before': issued_before})
+    transaction.on_commit(lambda: cache.set(TOKEN_EPOCH_KEY, issued_before.timestamp(), None))
+
+
+def current_token_epoch():
+    epoch = cache.get(TOKEN_EPOCH_KEY)
+    if epoch is None:
+        epoch = _stored_token_epoch()
+    return epoch
+
+
+def _stored_token_epoch():
+    from account.models import TokenEpoch
+
+    row = TokenEpoch.objects.filter(pk=1).first()
+    epoch = row.issued_before.timestamp() if row else 0
+    # add, not set: never overwrite a newer value published by a revocation
+    cache.add(TOKEN_EPOCH_KEY, epoch, None)
+    return epoch
+
+
+def current_token_generation(user_id):
+    generation = cache.get(token_generation_key(user_id))
+    if generation is None:
+        generation = _stored_token_generation(user_id)
+    return generation
+
+
+def _stored_token_generation(user_id):
+    generation = (
+        get_user_model().objects.filter(pk=user_id).values_list('token_generation', flat=True).first() or 0
+    )
+    cache.add(token_generation_key(user_id), generation, None)
+    return generation
+
+
+def _issued_at(token):
+    if 'iat' in token:
+        return token['iat']
+    # Tokens without an iat claim: derive it from the expiry
+    lifetime = token.lifetime if isinstance(token.lifetime, datetime.timedelta) else datetime.timedelta(0)
+    return token['exp'] - lifetime.total_seconds()
+
+
+def is_token_revoked(token, generation, epoch):
+    # Tokens issued before generations existed carry none and count as generation 0.
+    # iat is in whole seconds: a token issued in the second of the revocation
+    # is kept rather than revoking logins made right after it.
+    return token.get(TOKEN_GENERATION_CLAIM, 0) != generation or _issued_at(token) < math.floor(epoch)
+
+
+class GenerationRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        # Copied into the access token derived from this refresh token
+        token[TOKEN_GENERATION_CLAIM] = user.token_generation
+        return token
+
+
+class GenerationTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = GenerationRefreshToken
+
+
+class GenerationTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        if is_token_revoked(refresh, current_token_generation(user_id), current_token_epoch()):
+            raise InvalidToken(_("Token has been revoked"))
+        return super().validate(attrs)
+
+
+# ----------------------------- authentication -----------------------------
+
+class LocalUserCache:
+    """
+    Small per-worker cache of ``user_id -> (version, user)`` entries living
+    for ``AUTH_USER_LOCAL_TTL`` seconds.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id, version):
+        entry = self.entries.get(user_id)
+        if entry and entry[0] == version and entry[1] > time.monotonic():
+            return entry[2]
+        return None
+
+    def set(self, user_id, version, user):
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                self.entries.clear()
+            self.entries[user_id] = (version, time.monotonic() + settings.AUTH_USER_LOCAL_TTL, user)
+
+
+local_users = LocalUserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        version_key, generation_key = auth_version_key(user_id), token_generation_key(user_id)
+        state = cache.get_many([version_key, generation_key, TOKEN_EPOCH_KEY])
+        generation = state.get(generation_key)
+        if generation is None:
+            generation = _stored_token_generation(user_id)
+        epoch = state.get(TOKEN_EPOCH_KEY)
+        if epoch is None:
+            epoch = _stored_token_epoch()
+        if is_token_revoked(validated_token, generation, epoch):
+            raise InvalidToken(_("Token has been revoked"))
+
+        version = state.get(version_key, 0)
+        user = local_users.get(user_id, version)
+        if user is None:
+            key = cached_user_key(user_id, version)
+            user = cache.get(key)
+            if user is None:
+                try:
+                    user = get_user_model().objects.get(**{api_settings.USER_ID_FIELD: user_id})
+                except get_user_model().DoesNotExist:
+                    raise AuthenticationFailed(_("User not found"), code="user_not_found")
+                cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+            local_users.set(user_id, version, user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        # Requests may modify request.user; the cached instance stays untouched
+        return copy.copy(user)
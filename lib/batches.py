@@ -0,0 +1,36 @@
+"""
+Batched DELETEs for large tables.
+
+Rows are deleted one id range at a time, every batch in its own short
+transaction, so no lock is held for long and no statement comes near the
+statement_timeout.
+"""
+from django.db import connection, transaction
+
+# Number of ids covered by one DELETE statement
+DELETE_BATCH_SIZE = 5000
+
+
+def delete_in_batches(table, where, params, batch_size=DELETE_BATCH_SIZE, using=(), returning='t.id'):
+    """
+    Delete the rows of ``table`` (alias ``t``) matching ``where``, joined with
+    the ``using`` tables, one id range at a time. Yields the ``returning``
+    rows of every committed batch.
+    """
+    joins = ''.join(f', {source}' for source in using)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN(t.id), MAX(t.id) FROM {table} t{joins} WHERE {where}', params)
+        low, high = cursor.fetchone()
+    if low is None:
+        return
+
+    using_clause = f" USING {', '.join(using)}" if using else ''
+    sql = (
+        f'DELETE FROM {table} t{using_clause} '
+        f'WHERE {where} AND t.id >= %(start)s AND t.id < %(stop)s RETURNING {returning}'
+    )
+    for start in range(low, high + 1, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, {**params, 'start': start, 'stop': start + batch_size})
+            rows = cursor.fetchall()
+        yield rows
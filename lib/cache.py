@@ -0,0 +1,29 @@
+from django_redis.cache import RedisCache
+
+from .metrics import CACHE_REQUESTS
+
+_MISSING = object()
+
+
+class InstrumentedRedisCache(RedisCache):
+    """
+    RedisCache counting hits and misses of get/get_many (and therefore
+    get_or_set) in ``cache_requests_total``.
+    """
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, default=_MISSING, version=version, client=client)
+        if value is _MISSING:
+            CACHE_REQUESTS.inc('miss')
+            return default
+        CACHE_REQUESTS.inc('hit')
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        values = super().get_many(keys, version=version, client=client)
+        if values:
+            CACHE_REQUESTS.inc('hit', amount=len(values))
+        if len(keys) > len(values):
+            CACHE_REQUESTS.inc('miss', amount=len(keys) - len(values))
+        return values
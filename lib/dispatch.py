@@ -0,0 +1,190 @@
+"""
+Transaction-aware, coalescing dispatch for signal receivers.
+
+``on_commit_batch`` collects items under a key for the current transaction
+and hands them to one callback when it commits (one call per savepoint
+level that opened a batch); nothing runs for rolled back work.
+
+``Coalescer`` builds on it for Celery work: targets triggered in one
+transaction are enqueued together on commit, and targets triggered by other
+transactions within ``window`` seconds join the same waiting job (kept in a
+Redis set), so e.g. many frames added to a group are synced by one task.
+
+``bulk_import`` suspends receivers decorated with ``suspendable`` and, once
+the block commits, runs each reconciler registered for the touched models
+once with all their primary keys.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import connection, transaction
+
+_state = threading.local()
+
+
+def on_commit_batch(key, item, flush):
+    """
+    Add ``item`` to the batch ``key`` of the current transaction. When the
+    transaction commits, ``flush`` is called once per batch with its list of
+    items. Items added inside a savepoint that rolls back are dropped with
+    it. Outside a transaction ``flush([item])`` runs immediately.
+    """
+    batches = getattr(_state, 'batches', None)
+    if batches is None:
+        batches = _state.batches = {}
+
+    # A batch is live while its callback is still queued on the connection;
+    # a rollback to a savepoint the callback was registered in discards it.
+    # Rollbacks only drop the newest entries, so a live callback keeps the
+    # index it was registered at.
+    hooks = connection.run_on_commit
+    live = [
+        batch for batch in batches.get(key, ())
+        if batch['index'] < len(hooks) and hooks[batch['index']][1] is batch['callback']
+    ]
+    batches[key] = live
+
+    # The item may join a batch only if rolling back any open savepoint
+    # discards both: the batch must have been opened inside all of them.
+    # Savepoints released since are kept in its set but can no longer roll back.
+    savepoints = set(connection.savepoint_ids)
+    for batch in reversed(live):
+        if savepoints <= batch['savepoints']:
+            batch['items'].append(item)
+            return
+
+    batch = {'items': [item], 'savepoints': savepoints}
+
+    def callback():
+        batches[key] = [other for other in batches.get(key, ()) if other is not batch]
+        flush(batch['items'])
+
+    batch['callback'] = callback
+    batch['index'] = len(hooks)
+    live.append(batch)
+    transaction.on_commit(callback)
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        # Not a Redis cache (e.g. tests on locmem): no cross-transaction window
+        return None
+
+
+class Coalescer:
+    """
+    Runs ``handler(targets)`` in a Celery task for the targets triggered
+    within ``window`` seconds. Targets are strings (ids are converted).
+    """
+    registry = {}
+
+    def __init__(self, name, handler, window=5, queue=None, pending_timeout=60 * 10):
+        self.name = name
+        self.handler = handler
+        self.window = window
+        self.queue = queue
+        # A lost worker never blocks future batches for longer than this
+        self.pending_timeout = pending_timeout
+        self.targets_key = f'coalesce_{name}_targets'
+        self.pending_key = f'coalesce_{name}_pending'
+        Coalescer.registry[name] = self
+
+    def trigger(self, *targets):
+        on_commit_batch(('coalesce', self.name), targets, self.enqueue)
+
+    def enqueue(self, batches):
+        from app_modules.master.tasks import run_coalesced_batch
+
+        targets = sorted({str(target) for batch in batches for target in batch})
+        if not targets:
+            return
+        redis = _redis() if self.window else None
+        if redis is None:
+            run_coalesced_batch.apply_async((self.name, targets), queue=self.queue)
+            return
+
+        pipeline = redis.pipeline()
+        pipeline.sadd(self.targets_key, *targets)
+        pipeline.set(self.pending_key, 1, nx=True, ex=self.pending_timeout)
+        _, scheduled = pipeline.execute()
+        if scheduled:
+            run_coalesced_batch.apply_async((self.name,), countdown=self.window, queue=self.queue)
+
+    def drain(self):
+        """
+        Take every waiting target. The pending flag is cleared first, so
+        targets triggered while the batch runs schedule a new one.
+        """
+        pipeline = _redis().pipeline()
+        pipeline.delete(self.pending_key)
+        pipeline.smembers(self.targets_key)
+        pipeline.delete(self.targets_key)
+        _, targets, _ = pipeline.execute()
+        return sorted(target.decode() for target in targets)
+
+    def run(self, targets=None):
+        if targets is None:
+            targets = self.drain()
+        if targets:
+            return self.handler(targets)
+        return None
+
+
+_reconcilers = defaultdict(list)
+
+
+def register_reconciler(reconcile, *models):
+    """
+    After a ``bulk_import`` block that saved or deleted instances of any of
+    ``models``, ``reconcile({model: pks})`` runs once with the touched ones.
+    """
+    for model in models:
+        _reconcilers[model].append(reconcile)
+
+
+def suspendable(receiver):
+    """
+    Skip the receiver inside ``bulk_import``; the instance is recorded for
+    the reconcilers of its model instead.
+    """
+
+    @wraps(receiver)
+    def wrapper(sender, instance=None, **kwargs):
+        touched = getattr(_state, 'touched', None)
+        if touched is not None:
+            touched[sender].add(instance.pk)
+            return None
+        return receiver(sender, instance=instance, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def bulk_import():
+    """
+    Suspend ``suspendable`` receivers for the block, e.g. around an import
+    or a bulk admin action, and reconcile the touched models once it commits.
+    """
+    if getattr(_state, 'touched', None) is not None:
+        # Nested: the outermost block reconciles
+        yield
+        return
+
+    _state.touched = touched = defaultdict(set)
+    try:
+        yield
+    finally:
+        _state.touched = None
+
+    calls = defaultdict(dict)
+    for model, pks in touched.items():
+        for reconcile in _reconcilers[model]:
+            calls[reconcile][model] = sorted(pks)
+    for reconcile, models in calls.items():
+        transaction.on_commit(lambda reconcile=reconcile, models=models: reconcile(models))
@@ -0,0 +1,86 @@
+"""
+Background image pipeline.
+
+Uploaded images are stored untouched. Models list their image fields in
+``rendition_fields``; after a commit that changes one of them, a Celery task
+renders the image at every width in ``IMAGE_RENDITION_WIDTHS`` for every
+format in ``IMAGE_RENDITION_FORMATS`` and records the results as
+``ImageRendition`` rows.
+"""
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+
+IMAGE_EXTENSIONS = ["png", "jpeg", "jpg", "jpe", "bmp", "webp"]
+
+
+def is_image_file(field_file):
+    return bool(field_file) and os.path.splitext(field_file.name)[1][1:].lower() in IMAGE_EXTENSIONS
+
+
+def supported_formats():
+    """
+    Configured rendition formats this Pillow build can encode, e.g. AVIF
+    only when the AVIF plugin is available.
+    """
+    Image.init()
+    return {
+        fmt: quality for fmt, quality in settings.IMAGE_RENDITION_FORMATS.items()
+        if fmt.upper() in Image.SAVE
+    }
+
+
+def _encode(image, fmt, quality):
+    image_io = BytesIO()
+    image.save(image_io, format=fmt.upper(), quality=quality)
+    return image_io.getvalue()
+
+
+def build_renditions(instance, field_name):
+    """
+    Replace the renditions of ``instance.<field_name>`` with freshly encoded
+    ones. Returns the created ``ImageRendition`` objects.
+    """
+    from app_modules.master.models import ImageRendition
+
+    content_type = ContentType.objects.get_for_model(instance)
+    stale = ImageRendition.objects.filter(content_type=content_type, object_id=instance.pk, field_name=field_name)
+    for rendition in stale:
+        rendition.file.delete(save=False)
+    stale.delete()
+
+    field_file = getattr(instance, field_name)
+    if not is_image_file(field_file):
+        return []
+
+    formats = supported_formats()
+    renditions = []
+    with field_file.open('rb'), Image.open(field_file) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+
+        # Never upscale: widths above the original collapse into the original size
+        widths = sorted({min(width, original.width) for width in settings.IMAGE_RENDITION_WIDTHS})
+        for width in widths:
+            image = original.copy()
+            image.thumbnail((width, original.height), Image.LANCZOS)
+
+            for fmt, quality in formats.items():
+                rendition = ImageRendition(
+                    content_type=content_type,
+                    object_id=instance.pk,
+                    field_name=field_name,
+                    source_name=field_file.name,
+                    format=fmt,
+                    width=image.width,
+                    height=image.height,
+                )
+                rendition.file.save(f"rendition.{fmt}", ContentFile(_encode(image, fmt, quality)), save=False)
+                renditions.append(rendition)
+
+    return ImageRendition.objects.bulk_create(renditions)
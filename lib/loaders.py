@@ -0,0 +1,36 @@
+class RequestLoader:
+    """
+    Batches lookups made while serializing one request.
+
+    Keys are collected with ``prime`` (typically by a list serializer before
+    it renders a page) and loaded together by ``batch_load_fn`` on the first
+    ``load``, so a page costs one query instead of one per row. Results are
+    kept on the request, so every serializer of the request shares them.
+    """
+
+    def __init__(self, batch_load_fn, default=None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self.loaded = {}
+        self.pending = set()
+
+    @classmethod
+    def for_request(cls, request, name, batch_load_fn, default=None):
+        loaders = getattr(request, '_batch_loaders', None)
+        if loaders is None:
+            loaders = request._batch_loaders = {}
+        if name not in loaders:
+            loaders[name] = cls(batch_load_fn, default=default)
+        return loaders[name]
+
+    def prime(self, keys):
+        self.pending.update(key for key in keys if key not in self.loaded)
+
+    def load(self, key):
+        if key not in self.loaded:
+            self.pending.add(key)
+            values = self.batch_load_fn(self.pending)
+            for pending_key in self.pending:
+                self.loaded[pending_key] = values.get(pending_key, self.default)
+            self.pending = set()
+        return self.loaded[key]
@@ -0,0 +1,237 @@
+"""
+Prometheus metrics shared by every web and Celery worker process.
+
+Counters and histograms are aggregated in process memory, which costs a dict
+update per observation, and the deltas are added to one Redis hash every
+``METRICS_FLUSH_INTERVAL`` seconds with a single pipelined round trip. Every
+process (gunicorn workers, Celery workers) adds into the same hash, so the
+``/metrics`` endpoint renders totals across all of them.
+"""
+import atexit
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_LE = re.compile(r'le="([^"]+)"')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+_UNESCAPE = re.compile(r'\\(.)')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _sample(name, labels):
+    return f'{name}{{{labels}}}' if labels else name
+
+
+class Registry:
+    def __init__(self, key='metrics'):
+        self.key = key
+        self.meta_key = f'{key}:meta'
+        self.metrics = {}
+        self.pending = defaultdict(float)
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add(self, sample, value):
+        with self.lock:
+            self.pending[sample] += value
+
+    def add_many(self, samples):
+        with self.lock:
+            for sample, value in samples:
+                self.pending[sample] += value
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        Add the pending deltas to the shared Redis hash. On failure they are
+        kept and retried with the next flush, so no observations are lost.
+        """
+        from django_redis import get_redis_connection
+
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(float)
+            self.last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            pipeline = get_redis_connection(settings.METRICS_REDIS_ALIAS).pipeline(transaction=False)
+            pipeline.hset(self.meta_key, mapping={
+                name: f'{metric.type}|{metric.documentation}' for name, metric in self.metrics.items()
+            })
+            for sample, value in pending.items():
+                pipeline.hincrbyfloat(self.key, sample, value)
+            pipeline.execute()
+        except Exception:
+            logger.warning('Could not flush metrics', exc_info=True)
+            self.add_many(pending.items())
+
+    def read(self):
+        from django_redis import get_redis_connection
+
+        self.flush()
+        connection = get_redis_connection(settings.METRICS_REDIS_ALIAS)
+        meta = {name.decode(): value.decode() for name, value in connection.hgetall(self.meta_key).items()}
+        samples = {sample.decode(): float(value) for sample, value in connection.hgetall(self.key).items()}
+        return meta, samples
+
+    def reset(self):
+        from django_redis import get_redis_connection
+
+        with self.lock:
+            self.pending.clear()
+        get_redis_connection(settings.METRICS_REDIS_ALIAS).delete(self.key, self.meta_key)
+
+
+def render(meta, samples):
+    """
+    Prometheus text exposition (version 0.0.4) of ``samples``, grouped by the
+    families described in ``meta`` (``{name: 'type|help'}``).
+    """
+    families = defaultdict(list)
+    for sample, value in samples.items():
+        name = sample.split('{', 1)[0]
+        family = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in meta:
+                family = name[:-len(suffix)]
+        families[family].append((sample, value))
+
+    def order(item):
+        sample = item[0]
+        le = _LE.search(sample)
+        return _LE.sub('', sample), float(le.group(1)) if le else 0.0
+
+    lines = []
+    for family in sorted(families):
+        metric_type, _, documentation = meta.get(family, 'untyped|').partition('|')
+        lines.append(f'# HELP {family} {documentation}')
+        lines.append(f'# TYPE {family} {metric_type}')
+        for sample, value in sorted(families[family], key=order):
+            lines.append(f'{sample} {int(value) if value.is_integer() else value}')
+    return '\n'.join(lines) + '\n'
+
+
+def parse_sample(sample):
+    """
+    ``('name', {label: value})`` of a sample key such as ``name{a="1",b="2"}``.
+    """
+    name, _, labels = sample.partition('{')
+    return name, {
+        label: _UNESCAPE.sub(lambda match: '\n' if match.group(1) == 'n' else match.group(1), value)
+        for label, value in _LABEL.findall(labels)
+    }
+
+
+def histogram_quantile(quantile, buckets):
+    """
+    Estimate a quantile from cumulative ``[(upper bound, count)]`` buckets by
+    linear interpolation inside the bucket it falls in, like PromQL does.
+    """
+    buckets = sorted(buckets)
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = quantile * buckets[-1][1]
+    lower_bound, lower_count = 0.0, 0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float('inf'):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.register(self)
+
+    def inc(self, *labelvalues, amount=1):
+        registry.add(_sample(self.name, _labels(self.labelnames, labelvalues)), amount)
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (float('inf'),)
+        registry.register(self)
+
+    def observe(self, value, *labelvalues):
+        labels = _labels(self.labelnames, labelvalues)
+        prefix = f'{labels},' if labels else ''
+        # Buckets are cumulative: the observation counts in every bucket from its own upwards
+        first = bisect.bisect_left(self.buckets, value)
+        samples = [
+            (f'{self.name}_bucket{{{prefix}le="{"+Inf" if bound == float("inf") else bound}"}}', 1)
+            for bound in self.buckets[first:]
+        ]
+        samples.append((_sample(f'{self.name}_sum', labels), value))
+        samples.append((_sample(f'{self.name}_count', labels), 1))
+        registry.add_many(samples)
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time until the response is returned, by route.', ('route', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries per request, by route.', ('route',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per request, by route.', ('route',),
+)
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by result (hit or miss).', ('result',))
+
+
+class QueryRecorder:
+    """
+    ``connection.execute_wrapper`` that counts and times the queries it sees.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
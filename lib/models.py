@@ -1,7 +1,21 @@
+import copy
+
+from django.core.files import File
 from model_utils.models import TimeStampedModel
 
 
 class BaseModel(TimeStampedModel):
+    """
+    Saves only the fields that changed since the instance was loaded.
+
+    Concrete field values are snapshotted when a row is loaded (``from_db``)
+    and after every save. An update then passes the changed fields as
+    ``update_fields`` without querying the row again, so post_save receivers
+    can rely on ``update_fields``, and skips the UPDATE when nothing changed.
+    ``get_dirty_fields()`` returns the changed fields with their loaded
+    values; inside post_save it still describes the save being handled.
+    """
+
     class Meta:
         abstract = True
 
@@ -13,20 +27,58 @@ class BaseModel(TimeStampedModel):
     def updated_on(self):
         return self.modified
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = instance._current_state()
+        return instance
+
+    def _current_state(self):
+        state = {}
+        for field in self._meta.concrete_fields:
+            # Deferred fields are not part of the snapshot until loaded
+            if field.attname in self.__dict__:
+                value = self.__dict__[field.attname]
+                # Stored and freshly assigned files compare by name
+                if isinstance(value, File):
+                    value = value.name
+                elif isinstance(value, (dict, list)):
+                    value = copy.deepcopy(value)
+                state[field.attname] = value
+        return state
+
+    def get_dirty_fields(self):
+        """
+        ``{field name: loaded value}`` of the fields changed since the last
+        load or save; every loaded field for an instance never loaded.
+        """
+        loaded = getattr(self, '_loaded_state', None)
+        current = self._current_state()
+        names = {field.attname: field.name for field in self._meta.concrete_fields}
+        if loaded is None:
+            return {names[attname]: None for attname in current}
+        return {
+            names[attname]: loaded.get(attname)
+            for attname, value in current.items()
+            if attname not in loaded or loaded[attname] != value
+        }
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        state = self._current_state()
+        if fields is not None:
+            refreshed = {self._meta.get_field(name).attname for name in fields}
+            state = {attname: value for attname, value in state.items() if attname in refreshed}
+        self._loaded_state = {**getattr(self, '_loaded_state', {}), **state}
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            # If self.pk is not None then it's an update.
-            cls = self.__class__
-            old = cls.objects.get(pk=self.pk)
-            # This will get the current model state since super().save() isn't called yet.
-            new = self  # This gets the newly instantiated Mode object with the new values.
-            changed_fields = []
-            for field in cls._meta.get_fields():
-                field_name = field.name
-                try:
-                    if getattr(old, field_name) != getattr(new, field_name):
-                        changed_fields.append(field_name)
-                except Exception as ex:  # Catch field does not exist exception
-                    pass
-            kwargs['update_fields'] = changed_fields
+        # Updates of loaded rows save the changed fields only; an explicit
+        # update_fields from the caller is kept as is.
+        if (
+            self.pk and not self._state.adding and getattr(self, '_loaded_state', None) is not None
+            and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+        ):
+            # An empty list makes Django skip the UPDATE and the save signals
+            kwargs['update_fields'] = list(self.get_dirty_fields())
         super().save(*args, **kwargs)
+        self._loaded_state = self._current_state()
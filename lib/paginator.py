@@ -1,17 +1,50 @@
+import base64
+import hashlib
+import json
+from operator import attrgetter
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(pagination.LimitOffsetPagination):
+    """
+    Limit/offset pagination, with an opt-in keyset mode.
+
+    Views that declare ``keyset_ordering`` (e.g. ``('-id',)`` or
+    ``('event_date', 'id')``) are paginated by keyset when the request
+    carries a ``cursor`` parameter (empty for the first page). Keyset pages
+    skip the OFFSET scan and report an estimated count, chosen per view with
+    ``keyset_count``: ``'estimated'`` (planner estimate, the default),
+    ``'cached'`` (exact count cached for ``count_cache_timeout`` seconds) or
+    ``None``. Ordering fields must be non-null.
+    """
     default_limit = 10
+    # Hard cap on one page, also applied to limit=all unless the view streams
+    # it (see lib.viewsets.StreamingListMixin).
+    max_limit = 1000
+    cursor_query_param = 'cursor'
+    count_cache_timeout = 60 * 5
 
     def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset_ordering = getattr(view, 'keyset_ordering', None)
+        self.keyset_mode = bool(self.keyset_ordering) and self.cursor_query_param in request.query_params
+        if self.keyset_mode:
+            return self.paginate_keyset(queryset, request, view)
+
         self.count = self.get_count(queryset)
         self.limit = self.get_limit(request, total_count=self.count)
         if self.limit is None:
             return None
 
         self.offset = self.get_offset(request)
-        self.request = request
         if self.count > self.limit and self.template is not None:
             self.display_page_controls = True
 
@@ -21,5 +54,126 @@ class CustomPagination(pagination.LimitOffsetPagination):
 
     def get_limit(self, request, total_count=None):
         if request.query_params.get(self.limit_query_param) == 'all':
-            return total_count
+            return min(total_count, self.max_limit)
         return super().get_limit(request=request)
+
+    def get_next_link(self):
+        if self.keyset_mode:
+            return self.next_link
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.keyset_mode:
+            return self.previous_link
+        return super().get_previous_link()
+
+    # ------------------------------ keyset mode ------------------------------
+
+    def paginate_keyset(self, queryset, request, view):
+        self.limit = super().get_limit(request) or self.default_limit
+        self.cursor = self.decode_cursor(request, queryset)
+        reverse = bool(self.cursor and self.cursor['r'])
+
+        ordering = [self._invert(field) for field in self.keyset_ordering] if reverse else list(self.keyset_ordering)
+        page_queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            page_queryset = page_queryset.filter(self._keyset_filter(ordering, self.cursor['v']))
+
+        results = list(page_queryset[:self.limit + 1])
+        has_more = len(results) > self.limit
+        results = results[:self.limit]
+        if reverse:
+            results.reverse()
+
+        self.next_link = self.previous_link = None
+        if results:
+            if has_more or reverse:
+                self.next_link = self.encode_cursor(results[-1], reverse=False)
+            if (has_more and reverse) or (self.cursor and not reverse):
+                self.previous_link = self.encode_cursor(results[0], reverse=True)
+
+        self.count = self.get_keyset_count(queryset, view)
+        return results
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _keyset_filter(ordering, values):
+        """
+        Rows strictly after ``values`` in ``ordering``:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = f"{name}__lt" if field.startswith('-') else f"{name}__gt"
+            term = Q(**{lookup: values[index]})
+            for previous, value in zip(ordering[:index], values):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    @staticmethod
+    def _ordering_field(model, field):
+        for name in field.lstrip('-').split('__'):
+            model_field = model._meta.get_field(name)
+            model = model_field.related_model
+        return model_field
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if not isinstance(cursor['r'], bool) or len(cursor['v']) != len(self.keyset_ordering):
+                raise ValueError
+            # Cursors come from the client: convert every value through its
+            # ordering field, so a tampered one is rejected here, not in SQL
+            cursor['v'] = [
+                self._ordering_field(queryset.model, field).to_python(value)
+                for field, value in zip(self.keyset_ordering, cursor['v'])
+            ]
+            if None in cursor['v']:
+                raise ValueError
+            return cursor
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound('Invalid cursor')
+
+    def encode_cursor(self, instance, reverse):
+        values = [
+            # Rows of a values() projection are dicts keyed by the ORM path
+            instance[field.lstrip('-')] if isinstance(instance, dict)
+            else attrgetter(field.lstrip('-').replace('__', '.'))(instance)
+            for field in self.keyset_ordering
+        ]
+        payload = json.dumps({'v': values, 'r': reverse}, cls=DjangoJSONEncoder)
+        encoded = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_keyset_count(self, queryset, view):
+        strategy = getattr(view, 'keyset_count', 'estimated')
+        if strategy == 'estimated':
+            return self.get_estimated_count(queryset)
+        if strategy == 'cached':
+            sql, params = queryset.order_by().query.sql_with_params()
+            key = 'pagination_count_' + hashlib.md5(f"{sql}{params}".encode()).hexdigest()
+            return cache.get_or_set(key, lambda: self.get_count(queryset), self.count_cache_timeout)
+        return None
+
+    @staticmethod
+    def get_estimated_count(queryset):
+        """
+        Row estimate from the Postgres planner, which uses pg_class.reltuples
+        and column statistics, so no rows are scanned.
+        """
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
@@ -1,3 +1,6 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.http import JsonResponse
 from rest_framework import renderers, status
 
@@ -99,3 +102,18 @@ class CustomRenderer(renderers.JSONRenderer):
                     field_errors[field] = errors
         return field_errors
 
+
+def stream_envelope(batches, status_code=status.HTTP_200_OK, extra=None):
+    """
+    The success envelope of CustomRenderer as byte chunks, one per batch of
+    results, so the whole list is never held in memory. ``extra`` keys
+    (e.g. count/next/previous) are emitted before ``results``.
+    """
+    head = {'success': True, 'message': RESPONSE_MESSAGE[status_code], 'status': status_code, **(extra or {})}
+    yield json.dumps(head, cls=DjangoJSONEncoder)[:-1].encode() + b', "results": ['
+    separator = b''
+    for batch in batches:
+        if batch:
+            yield separator + b', '.join(json.dumps(item, cls=DjangoJSONEncoder).encode() for item in batch)
+            separator = b', '
+    yield b']}'
@@ -1,4 +1,9 @@
-from django.http import JsonResponse
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
 
 from rest_framework.serializers import Serializer
 
@@ -26,3 +31,20 @@ class CustomResponse(JsonResponse):
         if headers:
             for name, value in headers.items():
                 self[name] = value
+
+
+def compute_etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return quote_etag(hashlib.md5(payload.encode()).hexdigest())
+
+
+def not_modified(request, etag):
+    """
+    A 304 response when the request's If-None-Match lists ``etag``, else None.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    return None
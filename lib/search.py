@@ -0,0 +1,118 @@
+"""
+Index-backed search for DRF viewsets.
+
+``TrigramSearchFilter`` is a drop-in replacement for ``SearchFilter``: a
+viewset opts in by listing it in ``filter_backends`` and declaring its
+``search_fields`` as before. Text fields are matched with ``ILIKE`` (the
+``trgm_contains`` lookup), which Postgres answers from ``gin_trgm_ops``
+indexes (see ``trigram_index``) instead of ``UPPER(...) LIKE`` sequential
+scans. Fields across relations are matched with a subquery on the related
+table, so its own index is used. Dates, booleans and numbers are compared
+exactly when the term parses as one.
+"""
+import datetime
+import operator
+from functools import reduce
+
+from django.contrib.postgres.indexes import GinIndex
+from django.db import connection, models
+from django.db.models import Lookup, Q
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework import ISO_8601
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+
+@models.CharField.register_lookup
+@models.TextField.register_lookup
+class TrigramContains(Lookup):
+    """
+    ``field ILIKE '%term%'``; served by a pg_trgm GIN index on the column.
+    """
+    lookup_name = 'trgm_contains'
+
+    def get_db_prep_lookup(self, value, connection):
+        escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return '%s', [f'%{escaped}%']
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} ILIKE {rhs}', lhs_params + rhs_params
+
+
+def trigram_index(*fields, name):
+    return GinIndex(fields=list(fields), name=name, opclasses=['gin_trgm_ops'] * len(fields))
+
+
+def ensure_trigram_extension():
+    """
+    The gin_trgm_ops operator class must exist before the indexes are created.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+def _parse_date(term):
+    for fmt in api_settings.DATE_INPUT_FORMATS:
+        try:
+            if fmt == ISO_8601:
+                return datetime.date.fromisoformat(term)
+            return datetime.datetime.strptime(term, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def field_condition(field, term):
+    """
+    Q matching ``term`` against the model field itself, or None when the term
+    cannot match a field of this type.
+    """
+    if isinstance(field, (models.CharField, models.TextField)):
+        return Q(**{f'{field.name}__trgm_contains': term})
+    if isinstance(field, models.DateField):
+        day = _parse_date(term)
+        return Q(**{field.name: day}) if day else None
+    if isinstance(field, models.BooleanField):
+        value = {'true': True, 'false': False}.get(term.lower())
+        return Q(**{field.name: value}) if value is not None else None
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return Q(**{field.name: int(term)}) if term.isdigit() else None
+    return None
+
+
+def search_condition(model, path, term):
+    """
+    Q matching ``term`` against ``path``. Paths across relations become
+    ``relation__in=<subquery on the related model>``.
+    """
+    relation, _, rest = path.partition(LOOKUP_SEP)
+    field = model._meta.get_field(relation)
+    if not rest:
+        return field_condition(field, term)
+
+    condition = search_condition(field.related_model, rest, term)
+    if condition is None:
+        return None
+    return Q(**{f'{relation}__in': field.related_model._default_manager.filter(condition).values('pk')})
+
+
+class TrigramSearchFilter(SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+
+        # Prefixed fields (^, =, @, $) keep SearchFilter's lookups
+        if any(field[0] in self.lookup_prefixes for field in search_fields):
+            return super().filter_queryset(request, queryset, view)
+
+        for term in search_terms:
+            conditions = [search_condition(queryset.model, path, term) for path in search_fields]
+            conditions = [condition for condition in conditions if condition is not None]
+            if not conditions:
+                return queryset.none()
+            queryset = queryset.filter(reduce(operator.or_, conditions))
+        return queryset
@@ -0,0 +1,32 @@
+from rest_framework import serializers
+
+
+class SrcsetField(serializers.Field):
+    """
+    Renditions of an image field as ``srcset`` strings keyed by format, e.g.
+    ``{"webp": "https://.../a.webp 320w, https://.../b.webp 640w"}``.
+
+    Prefetch ``renditions`` on the queryset to avoid a query per object.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        image = getattr(instance, self.image_field)
+        if not image:
+            return {}
+
+        srcset = {}
+        renditions = sorted(instance.renditions.all(), key=lambda rendition: rendition.width)
+        for rendition in renditions:
+            # Renditions of a replaced image stay hidden until the new ones are ready
+            if rendition.field_name != self.image_field or rendition.source_name != image.name:
+                continue
+            url = request.build_absolute_uri(rendition.file.url) if request else rendition.file.url
+            srcset.setdefault(rendition.format, []).append(f"{url} {rendition.width}w")
+        return {fmt: ", ".join(candidates) for fmt, candidates in srcset.items()}
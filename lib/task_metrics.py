@@ -0,0 +1,90 @@
+"""
+Celery task metrics, exported with the HTTP metrics (see lib.metrics).
+
+Publishers stamp every message with its publish time; workers record per
+task name the time from publish to start, the run time, the rows the task's
+INSERT/UPDATE/DELETE statements wrote, and the final state. Connected from
+config.celery, so both the web processes (publishing) and the workers
+(running) install the hooks.
+"""
+import contextlib
+import time
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.db import connection
+
+from .metrics import Counter, Histogram, registry
+
+PUBLISHED_AT_HEADER = 'published_at'
+TASK_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 900, 1800, 3600)
+
+TASK_QUEUE_TIME = Histogram(
+    'celery_task_queue_seconds', 'Time from publishing a task to a worker starting it.', ('task',),
+    buckets=TASK_BUCKETS,
+)
+TASK_RUN_TIME = Histogram('celery_task_run_seconds', 'Task execution time.', ('task',), buckets=TASK_BUCKETS)
+TASK_ROWS_WRITTEN = Counter('celery_task_rows_written_total', 'Rows inserted, updated or deleted by tasks.', ('task',))
+TASK_RUNS = Counter('celery_tasks_total', 'Finished task runs by final state.', ('task', 'state'))
+
+
+class RowRecorder:
+    """
+    ``connection.execute_wrapper`` summing the rows written by data modifying
+    statements.
+    """
+
+    def __init__(self):
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.lstrip()[:6].upper() != 'SELECT':
+            rowcount = context['cursor'].rowcount
+            if rowcount and rowcount > 0:
+                self.rows += rowcount
+        return result
+
+
+# task_id -> (start time, rows recorder, installed execute wrapper)
+_running = {}
+
+
+@before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def _published_at(task):
+    request = task.request
+    published_at = getattr(request, PUBLISHED_AT_HEADER, None)
+    if published_at is None:
+        published_at = (getattr(request, 'headers', None) or {}).get(PUBLISHED_AT_HEADER)
+    return published_at
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, task=None, **kwargs):
+    published_at = _published_at(task)
+    if published_at is not None:
+        TASK_QUEUE_TIME.observe(max(time.time() - float(published_at), 0), task.name)
+
+    recorder = RowRecorder()
+    stack = contextlib.ExitStack()
+    stack.enter_context(connection.execute_wrapper(recorder))
+    _running[task_id] = (time.perf_counter(), recorder, stack)
+
+
+@task_postrun.connect
+def stop_task_timer(task_id=None, task=None, state=None, **kwargs):
+    running = _running.pop(task_id, None)
+    if running is None:
+        return
+    started, recorder, stack = running
+    stack.close()
+
+    TASK_RUN_TIME.observe(time.perf_counter() - started, task.name)
+    if recorder.rows:
+        TASK_ROWS_WRITTEN.inc(task.name, amount=recorder.rows)
+    TASK_RUNS.inc(task.name, state or 'UNKNOWN')
+    registry.maybe_flush()
@@ -0,0 +1,130 @@
+"""
+Video compositing used by every path that overlays a customer frame on a video.
+
+The frame image is pre-scaled once per target resolution and overlaid in a
+single ffmpeg pass. Every job works inside its own temporary directory, so
+concurrent renders never share files.
+"""
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+import ffmpeg
+from PIL import Image
+from django.conf import settings
+
+SCALED_FRAME_DIRECTORY = 'frame-scaled'
+
+# Software x264 presets, so a render costs the same on any worker host.
+VIDEO_PRESETS = {
+    'fast': {'crf': 28, 'preset': 'veryfast', 'threads': 2},
+    'balanced': {'crf': 23, 'preset': 'faster', 'threads': 2},
+    'quality': {'crf': 20, 'preset': 'medium', 'threads': 0},
+}
+
+
+def probe_media(path):
+    """
+    Return width, height, duration and codec of the first visual stream.
+    """
+    info = ffmpeg.probe(path)
+    stream = next(
+        (stream for stream in info['streams'] if stream.get('codec_type') == 'video'),
+        info['streams'][0]
+    )
+    duration = stream.get('duration') or info.get('format', {}).get('duration')
+    return {
+        'width': int(stream['width']),
+        'height': int(stream['height']),
+        'duration': float(duration) if duration else None,
+        'codec': stream.get('codec_name'),
+    }
+
+
+def stored_metadata(path, fields=('width', 'height', 'duration', 'codec')):
+    """
+    Probe an uploaded file for the metadata columns kept on its model.
+    Returns an empty dict when ffprobe cannot read the file.
+    """
+    try:
+        meta = probe_media(path)
+    except (ffmpeg.Error, OSError, KeyError, IndexError):
+        return {}
+    return {field: meta[field] for field in fields}
+
+
+@contextmanager
+def job_directory(parent=None):
+    """
+    Temporary working directory for one render, removed afterwards.
+    """
+    path = tempfile.mkdtemp(prefix='render_', dir=parent)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def frame_placement(video_size, frame_size):
+    """
+    Scale the frame to fit inside the video and centre it. Returns
+    ``(width, height, x, y)`` of the scaled frame.
+    """
+    video_width, video_height = video_size
+    frame_width, frame_height = frame_size
+    scale_factor = min(video_width / frame_width, video_height / frame_height)
+    width = max(int(frame_width * scale_factor), 1)
+    height = max(int(frame_height * scale_factor), 1)
+    return width, height, (video_width - width) // 2, (video_height - height) // 2
+
+
+def scaled_frame(frame_image_path, width, height, directory=None):
+    """
+    Return the path of the frame image resized to ``width`` x ``height``.
+    Resized frames are kept next to each other under ``frame-scaled/`` and
+    reused by every later render at the same resolution. Every use refreshes
+    the file's mtime; ``collect_orphan_files`` removes the ones left unused.
+    """
+    directory = directory or os.path.join(settings.MEDIA_ROOT, SCALED_FRAME_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+
+    name = os.path.splitext(os.path.basename(frame_image_path))[0]
+    path = os.path.join(directory, f"{name}_{width}x{height}.png")
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with Image.open(frame_image_path) as image:
+            image.convert('RGBA').resize((width, height), Image.LANCZOS).save(temp_path, format='PNG')
+        os.replace(temp_path, path)
+    return path
+
+
+def composite_video(video_path, frame_image_path, output_path, video_meta=None, frame_meta=None,
+                    preset=None, scaled_frame_directory=None):
+    """
+    Overlay the frame image on the video in a single ffmpeg pass.
+
+    ``video_meta`` and ``frame_meta`` are the stored results of
+    ``probe_media``; the files are only probed when they are missing.
+    """
+    video_meta = video_meta if video_meta and video_meta.get('width') else probe_media(video_path)
+    frame_meta = frame_meta if frame_meta and frame_meta.get('width') else probe_media(frame_image_path)
+    options = VIDEO_PRESETS[preset or settings.VIDEO_RENDER_PRESET]
+
+    width, height, x, y = frame_placement(
+        (video_meta['width'], video_meta['height']), (frame_meta['width'], frame_meta['height'])
+    )
+    frame_path = scaled_frame(frame_image_path, width, height, directory=scaled_frame_directory)
+
+    video = ffmpeg.input(video_path)
+    overlay = ffmpeg.overlay(video.video, ffmpeg.input(frame_path), x=x, y=y)
+    ffmpeg.output(
+        overlay, video['a?'], output_path,
+        vcodec='libx264', acodec='copy', pix_fmt='yuv420p', movflags='+faststart',
+        crf=options['crf'], preset=options['preset'], threads=options['threads'],
+    ).overwrite_output().run(quiet=True)
+
+    return output_path
@@ -1,11 +1,96 @@
+from django.http import StreamingHttpResponse
 from rest_framework import mixins
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from .renderer import CustomRenderer, stream_envelope
 
-class BaseModelViewSet(mixins.CreateModelMixin,
+
+class StreamingListMixin:
+    """
+    Streams ``list`` in the CustomRenderer envelope instead of rendering it
+    in memory. Rows are read through a server-side cursor and serialized
+    ``stream_chunk_size`` at a time (prefetches run per chunk), so worker
+    memory stays flat however many rows are returned.
+
+    Unpaginated views always stream; paginated views stream ``limit=all``,
+    with ``count`` and empty ``next``/``previous``. Other renderers, such as
+    the browsable API, get the regular response.
+    """
+    stream_chunk_size = 500
+
+    def should_stream(self, request):
+        if not isinstance(request.accepted_renderer, CustomRenderer):
+            return False
+        if self.paginator is None:
+            return True
+        return request.query_params.get(getattr(self.paginator, 'limit_query_param', 'limit')) == 'all'
+
+    def stream_batches(self, queryset):
+        chunk = []
+        for instance in queryset.iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(instance)
+            if len(chunk) == self.stream_chunk_size:
+                yield self.get_serializer(chunk, many=True).data
+                chunk = []
+        if chunk:
+            yield self.get_serializer(chunk, many=True).data
+
+    def list(self, request, *args, **kwargs):
+        if not self.should_stream(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        extra = None
+        if self.paginator is not None:
+            extra = {'count': queryset.count(), 'next': None, 'previous': None}
+        return StreamingHttpResponse(
+            stream_envelope(self.stream_batches(queryset), extra=extra), content_type='application/json'
+        )
+
+
+class BaseModelViewSet(StreamingListMixin,
+                       mixins.CreateModelMixin,
                        mixins.RetrieveModelMixin,
                        mixins.UpdateModelMixin,
                        mixins.DestroyModelMixin,
                        mixins.ListModelMixin,
                        GenericViewSet):
     http_method_names = ('get', 'post', 'patch', 'delete')
+
+
+class ProjectionListMixin:
+    """
+    Serves ``list`` from a flat ``values()`` projection, without building
+    model instances or running a serializer.
+
+    ``projection`` maps response keys to ORM paths. Keys in
+    ``projection_file_fields`` hold file names and are returned as absolute
+    media URLs, like a serializer FileField would.
+    """
+    projection = {}
+    projection_file_fields = {}
+
+    def get_projection_constants(self):
+        """Values that are the same for every row of the response."""
+        return {}
+
+    def project(self, rows):
+        request = self.request
+        constants = self.get_projection_constants()
+        results = []
+        for row in rows:
+            item = {key: row[path] for key, path in self.projection.items()}
+            for key, storage in self.projection_file_fields.items():
+                item[key] = request.build_absolute_uri(storage.url(item[key])) if item[key] else None
+            item.update(constants)
+            results.append(item)
+        return results
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values(*set(self.projection.values()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.project(page))
+        return Response(self.project(queryset))